@@ -0,0 +1,104 @@
+import argparse
+import json
+import time
+from itertools import islice
+from typing import Dict, List
+
+from converters import KILTTrecwebConverter, MarcoTrecwebConverter, WapoTrecwebConverter
+from passage_chunkers import SpacyPassageChunker, RegexPassageChunker
+
+parser = argparse.ArgumentParser(description='Compares the regex passage chunker against the spacy passage chunker')
+parser.add_argument('--collection', type=str, default="./data/collections/msmarco-docs.tsv", help="Path to the raw collection to sample from")
+parser.add_argument('--collection_name', type=str, default="marco", help="Collection type: kilt, marco or wapo")
+parser.add_argument('--sample_size', type=int, default=1000, help="Number of documents to compare the chunkers on")
+parser.add_argument('--max_passage_size', type=int, default=250, help="Max passage size: int")
+parser.add_argument('--report_path', type=str, default=None, help="Optional path to write the report to as JSON")
+
+converters = {
+    'kilt': KILTTrecwebConverter,
+    'marco': MarcoTrecwebConverter,
+    'wapo': WapoTrecwebConverter
+}
+
+def passage_boundaries(passages: List[Dict]) -> set:
+
+    """
+    Word offsets at which each passage ends, so that chunkers which
+    normalise whitespace differently can still be compared
+    """
+
+    boundaries = set()
+    offset = 0
+
+    for passage in passages[:-1]:
+        offset += len(passage["body"].split())
+        boundaries.add(offset)
+
+    return boundaries
+
+def time_chunker(passage_chunker, document_bodies: List[str]):
+    start_time = time.perf_counter()
+    chunked_documents = list(passage_chunker.chunk_documents(document_bodies))
+    return chunked_documents, time.perf_counter() - start_time
+
+def compare_chunkers(document_bodies: List[str], max_passage_size: int) -> Dict:
+
+    """
+    Runs both chunkers on the same documents and reports their throughput and
+    how closely the regex passages agree with the spacy passages
+    """
+
+    spacy_documents, spacy_seconds = time_chunker(SpacyPassageChunker(max_passage_size), document_bodies)
+    regex_documents, regex_seconds = time_chunker(RegexPassageChunker(max_passage_size), document_bodies)
+
+    same_passage_count = 0
+    identical_passages = 0
+    boundary_agreement = 0.0
+
+    for spacy_passages, regex_passages in zip(spacy_documents, regex_documents):
+
+        if len(spacy_passages) == len(regex_passages):
+            same_passage_count += 1
+
+        if [passage["body"].split() for passage in spacy_passages] == [passage["body"].split() for passage in regex_passages]:
+            identical_passages += 1
+
+        spacy_boundaries = passage_boundaries(spacy_passages)
+        regex_boundaries = passage_boundaries(regex_passages)
+        all_boundaries = spacy_boundaries | regex_boundaries
+
+        if all_boundaries:
+            boundary_agreement += len(spacy_boundaries & regex_boundaries) / len(all_boundaries)
+        else:
+            boundary_agreement += 1.0
+
+    document_count = max(len(document_bodies), 1)
+
+    return {
+        "documents": len(document_bodies),
+        "spacy_docs_per_second": len(document_bodies) / spacy_seconds if spacy_seconds else None,
+        "regex_docs_per_second": len(document_bodies) / regex_seconds if regex_seconds else None,
+        "speedup": spacy_seconds / regex_seconds if regex_seconds else None,
+        "spacy_passages_per_document": sum(len(passages) for passages in spacy_documents) / document_count,
+        "regex_passages_per_document": sum(len(passages) for passages in regex_documents) / document_count,
+        "same_passage_count": same_passage_count / document_count,
+        "identical_passages": identical_passages / document_count,
+        "boundary_agreement": boundary_agreement / document_count
+    }
+
+if __name__ == '__main__':
+
+    args = parser.parse_args()
+
+    converter = converters[args.collection_name]()
+
+    with open(args.collection, 'rb') as collection:
+        document_bodies = [doc_body for _, _, _, doc_body in converter.iter_documents(islice(collection, args.sample_size))]
+
+    report = compare_chunkers(document_bodies, args.max_passage_size)
+
+    print(json.dumps(report, indent=4))
+
+    if args.report_path:
+        with open(args.report_path, 'w') as report_file:
+            json.dump(report, report_file, indent=4)
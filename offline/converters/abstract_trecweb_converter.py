@@ -1,5 +1,7 @@
+from .duplicates_index import DuplicatesIndex
 from abc import ABC, abstractmethod
-from typing import Dict, Tuple
+from typing import Dict, Iterable, Iterator, Tuple, Union
+import os
 
 
 class AbstractTrecwebConverter(ABC):
@@ -7,11 +9,24 @@ class AbstractTrecwebConverter(ABC):
     @abstractmethod
     def get_document_attributes(self, document) -> Tuple[str, str, str, str]:
         """
-        Retrieves the id, url, title and body of a document
+        Retrieves the id, url, title and body of a document, returns None if
+        the document is missing any of them
         """
         
         pass
 
+    def iter_documents(self, lines: Iterable[Union[str, bytes]]) -> Iterator[Tuple[str, str, str, str]]:
+        """
+        Parses a stream of raw records, a file or a batch of its lines, once each
+        and yields the id, url, title and body of every complete document
+        """
+
+        for line in lines:
+            document_attributes = self.get_document_attributes(line)
+
+            if document_attributes:
+                yield document_attributes
+
     @abstractmethod
     def create_duplicates_dictionary(self, duplicates_file_path) -> Dict:
         """
@@ -19,4 +34,25 @@ class AbstractTrecwebConverter(ABC):
         if a document is a duplicate
         """
 
-        pass
\ No newline at end of file
+        pass
+
+    def load_duplicates_index(self, duplicates_file_path) -> DuplicatesIndex:
+        """
+        Loads a compact, memory-mapped version of the duplicates dictionary. It is
+        built once from the duplicates file and cached next to it, then rebuilt
+        only when the duplicates file changes.
+        """
+
+        index_path = duplicates_file_path + '.{}.dupidx'.format(type(self).__name__)
+
+        if os.path.isfile(index_path):
+            duplicates_index = DuplicatesIndex(index_path)
+
+            if duplicates_index.is_up_to_date(duplicates_file_path):
+                return duplicates_index
+
+            duplicates_index.close()
+
+        DuplicatesIndex.build(self.create_duplicates_dictionary(duplicates_file_path), index_path, duplicates_file_path)
+
+        return DuplicatesIndex(index_path)
@@ -0,0 +1,113 @@
+from typing import Dict
+import mmap
+import os
+import struct
+
+
+class DuplicatesIndex:
+
+    """
+    Compact, read-only lookup of duplicate document ids backed by a memory-mapped file.
+    The ids are stored as a sorted table of fixed-width, NUL padded keys followed by one
+    value byte per key, and looked up with a binary search. Processes forked from the
+    one that opened the index share its pages instead of each holding a Python dict.
+
+    It behaves like the duplicates dictionary it replaces. Values set at runtime, such
+    as marking the first copy of a WaPo document as seen, are kept in a small overlay.
+    """
+
+    MAGIC = b'DUPIDX01'
+    # magic, key width, key count, size and modification time of the duplicates file
+    HEADER = struct.Struct('<8sIQQq')
+
+    def __init__(self, index_path: str) -> None:
+        self.index_path = index_path
+        self.overlay = {}
+
+        with open(index_path, 'rb') as index_file:
+            self.buffer = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.key_width, self.key_count, self.source_size, self.source_mtime = self.HEADER.unpack_from(self.buffer, 0)
+
+        if magic != self.MAGIC:
+            raise ValueError("{} is not a duplicates index".format(index_path))
+
+        self.keys_offset = self.HEADER.size
+        self.values_offset = self.keys_offset + self.key_width * self.key_count
+
+    @classmethod
+    def build(cls, duplicates_lookup_dict: Dict, index_path: str, source_path: str) -> None:
+
+        """
+        Writes a duplicates dictionary to disk as an index, atomically
+        """
+
+        encoded_ids = {doc_id.encode('utf-8'): value for doc_id, value in duplicates_lookup_dict.items()}
+        key_width = max((len(key) for key in encoded_ids), default=1)
+        keys = sorted(encoded_ids)
+
+        source_stat = os.stat(source_path)
+
+        temporary_path = index_path + '.tmp'
+        with open(temporary_path, 'wb') as index_file:
+            index_file.write(cls.HEADER.pack(cls.MAGIC, key_width, len(keys), source_stat.st_size, source_stat.st_mtime_ns))
+            index_file.write(b''.join(key.ljust(key_width, b'\0') for key in keys))
+            index_file.write(bytes(encoded_ids[key] for key in keys))
+
+        os.replace(temporary_path, index_path)
+
+    def is_up_to_date(self, source_path: str) -> bool:
+        source_stat = os.stat(source_path)
+        return self.source_size == source_stat.st_size and self.source_mtime == source_stat.st_mtime_ns
+
+    def get(self, doc_id: str, default=None):
+
+        if doc_id in self.overlay:
+            return self.overlay[doc_id]
+
+        key = doc_id.encode('utf-8')
+        if len(key) > self.key_width:
+            return default
+
+        key = key.ljust(self.key_width, b'\0')
+
+        low, high = 0, self.key_count
+        while low < high:
+            middle = (low + high) // 2
+            key_offset = self.keys_offset + middle * self.key_width
+            middle_key = self.buffer[key_offset:key_offset + self.key_width]
+
+            if middle_key < key:
+                low = middle + 1
+            elif middle_key > key:
+                high = middle
+            else:
+                return self.buffer[self.values_offset + middle]
+
+        return default
+
+    def __contains__(self, doc_id: str) -> bool:
+        return self.get(doc_id) is not None
+
+    def __getitem__(self, doc_id: str):
+        value = self.get(doc_id)
+        if value is None:
+            raise KeyError(doc_id)
+        return value
+
+    def __setitem__(self, doc_id: str, value) -> None:
+        self.overlay[doc_id] = value
+
+    def __len__(self) -> int:
+        return self.key_count
+
+    def __getstate__(self) -> Dict:
+        # the memory map is reopened, rather than copied, when sent to another process
+        return {'index_path': self.index_path, 'overlay': self.overlay}
+
+    def __setstate__(self, state: Dict) -> None:
+        self.__init__(state['index_path'])
+        self.overlay = state['overlay']
+
+    def close(self) -> None:
+        self.buffer.close()
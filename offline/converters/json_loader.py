@@ -0,0 +1,23 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def json_loads(document):
+
+    """
+    Parses a JSON document, str or bytes, with orjson when it is installed.
+    Anything orjson rejects but the standard library accepts (e.g. NaN) is
+    parsed again with json, so the result never depends on the decoder.
+    """
+
+    if orjson is not None:
+        try:
+            return orjson.loads(document)
+        except ValueError:
+            pass
+
+    return json.loads(document)
@@ -1,6 +1,6 @@
 from .abstract_trecweb_converter import AbstractTrecwebConverter
+from .json_loader import json_loads
 from typing import Tuple, Dict
-import json
 
 
 class KILTTrecwebConverter(AbstractTrecwebConverter):
@@ -8,7 +8,7 @@ class KILTTrecwebConverter(AbstractTrecwebConverter):
     
     def get_document_attributes(self, document) -> Tuple[str, str, str, str]:
         
-        parsed_document = json.loads(document)
+        parsed_document = json_loads(document)
         idx = 'KILT_' + parsed_document['wikipedia_id']
         url = parsed_document['history']['url']
         title = parsed_document['wikipedia_title']
@@ -6,6 +6,9 @@ class MarcoTrecwebConverter(AbstractTrecwebConverter):
     
     def get_document_attributes(self, document) -> Tuple[str, str, str, str]:
 
+        if isinstance(document, bytes):
+            document = document.decode('utf-8')
+
         try:
             idx, url, title, body = document.strip().split('\t')
             idx = "MARCO_" + idx
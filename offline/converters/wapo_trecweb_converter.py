@@ -1,6 +1,6 @@
 from .abstract_trecweb_converter import AbstractTrecwebConverter
+from .json_loader import json_loads
 from typing import Tuple, Dict
-import json
 
 
 class WapoTrecwebConverter(AbstractTrecwebConverter):
@@ -8,7 +8,7 @@ class WapoTrecwebConverter(AbstractTrecwebConverter):
 
     def get_document_attributes(self, document) -> Tuple[str, str, str, str]:
 
-        document = json.loads(document)
+        document = json_loads(document)
         
         idx = 'WAPO_' + str(document['id'])
         
@@ -27,14 +27,16 @@ class WapoTrecwebConverter(AbstractTrecwebConverter):
 
         
         #Get the document body
-        body = ''
+        body_parts = []
         contents = document['contents']
         try:
             for item in contents:
                 if 'subtype' in item and item['subtype'] == 'paragraph':
-                    body += ' ' + item['content']
+                    body_parts.append(' ' + item['content'])
         except:
-            body += 'No body'
+            body_parts.append('No body')
+
+        body = ''.join(body_parts)
         
         
         return idx, url, title, body
@@ -1 +1,2 @@
-from .pyserini_index_generator import PyseriniIndexGenerator
\ No newline at end of file
+from .pyserini_index_generator import PyseriniIndexGenerator
+from .pyserini_json_index_generator import PyseriniJsonIndexGenerator
\ No newline at end of file
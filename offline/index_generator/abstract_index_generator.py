@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from typing import List
 
 class AbstractIndexGenerator(ABC):
 
@@ -7,4 +8,11 @@ class AbstractIndexGenerator(ABC):
         """
         Generates an index for use within the online system.
         """
-        pass
\ No newline at end of file
+        pass
+
+    @abstractmethod
+    def merge_indexes(self, input_indexes: List[str], output_directory) -> None:
+        """
+        Combines existing indexes into one without indexing their documents again.
+        """
+        pass
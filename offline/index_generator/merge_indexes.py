@@ -0,0 +1,32 @@
+import argparse
+
+from pyserini.pyclass import autoclass
+
+JPaths = autoclass('java.nio.file.Paths')
+JFSDirectory = autoclass('org.apache.lucene.store.FSDirectory')
+JIndexWriter = autoclass('org.apache.lucene.index.IndexWriter')
+JIndexWriterConfig = autoclass('org.apache.lucene.index.IndexWriterConfig')
+JOpenMode = autoclass('org.apache.lucene.index.IndexWriterConfig$OpenMode')
+
+parser = argparse.ArgumentParser(description='Merges Lucene indexes without re-indexing their documents')
+parser.add_argument('-index', type=str, required=True, help="Directory to write the merged index to")
+parser.add_argument('-inputs', type=str, nargs='+', required=True, help="Indexes to merge")
+parser.add_argument('-optimize', default=False, action='store_true', help="Force merge the result into a single segment")
+
+if __name__ == '__main__':
+
+    args = parser.parse_args()
+
+    config = JIndexWriterConfig()
+    config.setOpenMode(JOpenMode.CREATE)
+
+    writer = JIndexWriter(JFSDirectory.open(JPaths.get(args.index)), config)
+
+    # addIndexes copies the segments of each index, nothing is re-tokenised or re-inverted
+    writer.addIndexes([JFSDirectory.open(JPaths.get(input_index)) for input_index in args.inputs])
+
+    if args.optimize:
+        writer.forceMerge(1)
+
+    writer.commit()
+    writer.close()
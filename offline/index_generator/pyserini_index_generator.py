@@ -1,14 +1,29 @@
 from .abstract_index_generator import AbstractIndexGenerator
+from typing import List
+import os
 import subprocess
 
 class PyseriniIndexGenerator(AbstractIndexGenerator):
 
+    collection = "TrecwebCollection"
+
+    def __init__(self, threads: int = 8) -> None:
+        # Anserini indexes one input file per thread, so this is only useful with sharded input
+        self.threads = threads
+
     def generate_index(self, input_directory, output_directory) -> None:
 
         subprocess.run(["python3", "-m", "pyserini.index",
-                        "-collection", "TrecwebCollection",
+                        "-collection", self.collection,
                         "-generator", "DefaultLuceneDocumentGenerator",
-                        "-threads", "8",
+                        "-threads", str(self.threads),
                         "-input", input_directory,
                         "-index", output_directory,
                         "-storePositions", "-storeRaw", "-storeDocvectors"])
+
+    def merge_indexes(self, input_indexes: List[str], output_directory) -> None:
+
+        # run in a separate process, like indexing, so the JVM never lives in the pipeline process
+        subprocess.run(["python3", os.path.join(os.path.dirname(__file__), "merge_indexes.py"),
+                        "-index", output_directory,
+                        "-inputs", *input_indexes])
@@ -0,0 +1,6 @@
+from .pyserini_index_generator import PyseriniIndexGenerator
+
+class PyseriniJsonIndexGenerator(PyseriniIndexGenerator):
+
+    # documents are JSON lines with the passages stored as structured raw JSON
+    collection = "JsonCollection"
@@ -1,11 +1,12 @@
 import argparse
-import os
-import subprocess
+import time
+from typing import Dict, Set
 
 from converters import KILTTrecwebConverter, MarcoTrecwebConverter, WapoTrecwebConverter
-from passage_chunkers import SpacyPassageChunker
-from index_generator import PyseriniIndexGenerator
-from utils.utils import write_documents_to_file
+from passage_chunkers import SpacyPassageChunker, RegexPassageChunker
+from index_generator import PyseriniIndexGenerator, PyseriniJsonIndexGenerator
+from utils.utils import write_documents_to_file, index_exists
+from utils.run_report import peak_rss_mb, write_run_report
 
 parser = argparse.ArgumentParser(description='Offline Pipeline Parameters')
 parser.add_argument('--kilt_collection', type=str, default="./data/collections/kilt_knowledgesource.json", help="Path to the raw kilt collection")
@@ -18,9 +19,14 @@ parser.add_argument('--wapo_duplicates', type=str, default="./data/duplicates_fi
 
 parser.add_argument('--passage_chunker', type=str, default="spacy", help="Passage Chunker, spacy or regex")
 parser.add_argument('--max_passage_size', type=int, default=250, help="Max passage size: int")
+parser.add_argument('--spacy_batch_size', type=int, default=32, help="Number of documents spacy segments at a time")
+parser.add_argument('--spacy_n_process', type=int, default=1, help="Number of processes spacy uses for segmentation, set to 1 when using --workers")
 
 parser.add_argument('--document_count', type=int, default=None, help="Number of documents to process per collection")
 
+parser.add_argument('--workers', type=int, default=1, help="Number of processes used to convert and chunk documents")
+parser.add_argument('--batch_size', type=int, default=64, help="Number of documents sent to a worker at a time")
+
 parser.add_argument('--skip_process_all', default=False, action='store_true')
 parser.add_argument('--skip_process_kilt', default=False, action='store_true')
 parser.add_argument('--skip_process_marco', default=False, action='store_true')
@@ -28,94 +34,195 @@ parser.add_argument('--skip_process_wapo', default=False, action='store_true')
 
 parser.add_argument('--skip_indexing', default=False, action='store_true')
 
+parser.add_argument('--no_resume', default=False, action='store_true', help="Ignore checkpoints and convert every collection from scratch")
+
+parser.add_argument('--checkpoint_dir', type=str, default="./data/checkpoints", help="Directory to keep conversion checkpoints in")
+
+parser.add_argument('--shard_size_mb', type=int, default=256, help="Maximum size of each processed file, in MB before compression")
+parser.add_argument('--compress', default=False, action='store_true', help="Gzip the processed files")
+
+parser.add_argument('--index_format', type=str, default="trecweb", choices=["trecweb", "json"], help="Format of the processed files and of the raw documents stored in the index")
+
+parser.add_argument('--docstore_dir', type=str, default="../shared/docstores", help="Directory to write the document stores the searcher serves documents from")
+parser.add_argument('--skip_docstore', default=False, action='store_true', help="Do not write document stores")
+
+parser.add_argument('--passage_index', default=False, action='store_true', help="Also build a passage-level index of each collection, one document per passage")
+parser.add_argument('--passage_indexer_input_dir', type=str, default="./data/passage_candidates", help="Directory with processed passage files for indexing")
+
 parser.add_argument('--indexer_input_dir', type=str, default="./data/index_candidates", help="Directory with processed files for indexing")
 parser.add_argument('--indexer_output_dir', type=str, default="../shared/indexes", help="Directory to write indexes to")
+parser.add_argument('--indexing_threads', type=int, default=8, help="Number of threads used to index, one processed file per thread")
+parser.add_argument('--report_path', type=str, default="./data/run_report.json", help="Where to write the per-stage timings and counters of the run")
+parser.add_argument('--all_index_mode', type=str, default="merge", choices=["merge", "reindex", "federated"], help="Build the ALL index by merging the collection indexes or by indexing every document again, or only index the collections for the searcher to search them together")
+
+def run_timed(timings: Dict, name: str, function, *args) -> None:
+
+    """
+    Runs a pipeline step and records how long it took
+    """
+
+    start_time = time.perf_counter()
+    function(*args)
+    timings[name] = time.perf_counter() - start_time
+
+def mark_stale(stale_indexes: Set, collection_name: str, conversion_stats) -> None:
+
+    """
+    Marks the indexes built from a collection as stale unless its conversion found the files up to date
+    """
+
+    if conversion_stats.status != 'up_to_date':
+        stale_indexes.update([collection_name, collection_name + '_passages', 'all'])
+
+def index_if_stale(timings: Dict, stale_indexes: Set, name: str, function, input_path, index_path: str) -> None:
+
+    """
+    Builds an index if its files were converted again in this run or it does not exist
+    """
+
+    if name not in stale_indexes and index_exists(index_path):
+        print("Keeping the {} index, it is up to date".format(name))
+        return
+
+    print("Indexing {}..".format(name))
+    run_timed(timings, name, function, input_path, index_path)
+    stale_indexes.discard(name)
 
 if __name__ == '__main__':
 
     args = parser.parse_args()
+
+    #spacy processes nested in the conversion workers oversubscribe the CPU and can deadlock when forked
+    if args.workers > 1 and args.spacy_n_process > 1:
+        print("--spacy_n_process is set to 1 as documents are already segmented in {} workers".format(args.workers))
+        args.spacy_n_process = 1
     
     passage_chunker = None
     if args.passage_chunker == 'spacy':
-        passage_chunker = SpacyPassageChunker(max_passage_size=args.max_passage_size)
+        passage_chunker = SpacyPassageChunker(max_passage_size=args.max_passage_size,
+            batch_size=args.spacy_batch_size, n_process=args.spacy_n_process)
+    elif args.passage_chunker == 'regex':
+        passage_chunker = RegexPassageChunker(max_passage_size=args.max_passage_size)
+    else:
+        parser.error("Unknown passage chunker: {}".format(args.passage_chunker))
 
     
-    index_generator = PyseriniIndexGenerator()
-
-    
-    trecweb_dump_path = './data/processed_trecweb'
-
-    if not os.path.isdir(trecweb_dump_path):
-        os.mkdir(trecweb_dump_path)
-    
-    if not os.path.isdir(args.indexer_input_dir):
-        os.mkdir(args.indexer_input_dir)
-
+    if args.index_format == 'json':
+        index_generator = PyseriniJsonIndexGenerator(threads=args.indexing_threads)
+    else:
+        index_generator = PyseriniIndexGenerator(threads=args.indexing_threads)
+
+    # passages are always written as json documents
+    passage_index_generator = PyseriniJsonIndexGenerator(threads=args.indexing_threads)
+
+    run_report = {'collections': {}, 'index_seconds': {}}
+    #indexes whose files were converted again in this run and not yet indexed
+    stale_indexes = set()
+
+    # processed files are written straight to indexer_input_dir/<collection> and indexed in place
+    conversion_options = {
+        'num_documents': args.document_count,
+        'workers': args.workers,
+        'batch_size': args.batch_size,
+        'output_directory': args.indexer_input_dir,
+        'checkpoint_directory': args.checkpoint_dir,
+        'shard_size': args.shard_size_mb * 1024 * 1024,
+        'compress': args.compress,
+        'index_format': args.index_format,
+        'docstore_directory': None if args.skip_docstore else args.docstore_dir,
+        'passage_directory': args.passage_indexer_input_dir if args.passage_index else None
+    }
 
     if not args.skip_process_kilt:
         print("Processing KILT...")
         kilt_trecweb_converter: KILTTrecwebConverter = KILTTrecwebConverter()
-        write_documents_to_file(args.kilt_collection, 'kilt', kilt_trecweb_converter, passage_chunker, 5903530, num_documents=args.document_count)
+        conversion_stats = write_documents_to_file(args.kilt_collection, 'kilt', kilt_trecweb_converter, passage_chunker, resume=not args.no_resume, **conversion_options)
+        run_report['collections'].setdefault('kilt', conversion_stats.to_dict())
+        mark_stale(stale_indexes, 'kilt', conversion_stats)
 
         if not args.skip_indexing:
-            print("Indexing the KILT trecweb file..")
-            subprocess.run(["cp", trecweb_dump_path + "/kilt.trecweb", args.indexer_input_dir])
-            index_generator.generate_index(args.indexer_input_dir, args.indexer_output_dir + "/kilt")
-            subprocess.run(["rm", args.indexer_input_dir + "/kilt.trecweb"])
+            index_if_stale(run_report['index_seconds'], stale_indexes, 'kilt', index_generator.generate_index, args.indexer_input_dir + "/kilt", args.indexer_output_dir + "/kilt")
+
+        if not args.skip_indexing and args.passage_index:
+            index_if_stale(run_report['index_seconds'], stale_indexes, 'kilt_passages', passage_index_generator.generate_index, args.passage_indexer_input_dir + "/kilt", args.indexer_output_dir + "/kilt_passages")
     
     if not args.skip_process_marco:
         print("Processing MARCO...")
         marco_trecweb_converter: MarcoTrecwebConverter = MarcoTrecwebConverter()
-        write_documents_to_file(args.marco_collection, 'marco', marco_trecweb_converter, passage_chunker, 3213835, args.marco_duplicates, num_documents=args.document_count)
+        conversion_stats = write_documents_to_file(args.marco_collection, 'marco', marco_trecweb_converter, passage_chunker, args.marco_duplicates, resume=not args.no_resume, **conversion_options)
+        run_report['collections'].setdefault('marco', conversion_stats.to_dict())
+        mark_stale(stale_indexes, 'marco', conversion_stats)
 
         if not args.skip_indexing:
-            print("Indexing the MARCO trecweb file..")
-            subprocess.run(["cp", trecweb_dump_path + "/marco.trecweb", args.indexer_input_dir])
-            index_generator.generate_index(args.indexer_input_dir, args.indexer_output_dir + "/marco")
-            subprocess.run(["rm", args.indexer_input_dir + "/marco.trecweb"])
+            index_if_stale(run_report['index_seconds'], stale_indexes, 'marco', index_generator.generate_index, args.indexer_input_dir + "/marco", args.indexer_output_dir + "/marco")
+
+        if not args.skip_indexing and args.passage_index:
+            index_if_stale(run_report['index_seconds'], stale_indexes, 'marco_passages', passage_index_generator.generate_index, args.passage_indexer_input_dir + "/marco", args.indexer_output_dir + "/marco_passages")
     
     if not args.skip_process_wapo:
         print("Processing WaPo..")
         wapo_trecweb_converter: WapoTrecwebConverter = WapoTrecwebConverter()
-        write_documents_to_file(args.wapo_collection, 'wapo', wapo_trecweb_converter, passage_chunker, 728626, args.wapo_duplicates, num_documents=args.document_count)
+        conversion_stats = write_documents_to_file(args.wapo_collection, 'wapo', wapo_trecweb_converter, passage_chunker, args.wapo_duplicates, resume=not args.no_resume, **conversion_options)
+        run_report['collections'].setdefault('wapo', conversion_stats.to_dict())
+        mark_stale(stale_indexes, 'wapo', conversion_stats)
 
         if not args.skip_indexing:
-            print("Indexing the WaPo trecweb file..")
-            subprocess.run(["cp", trecweb_dump_path + "/wapo.trecweb", args.indexer_input_dir])
-            index_generator.generate_index(args.indexer_input_dir, args.indexer_output_dir + "/wapo")
-            subprocess.run(["rm", args.indexer_input_dir + "/wapo.trecweb"])
+            index_if_stale(run_report['index_seconds'], stale_indexes, 'wapo', index_generator.generate_index, args.indexer_input_dir + "/wapo", args.indexer_output_dir + "/wapo")
+
+        if not args.skip_indexing and args.passage_index:
+            index_if_stale(run_report['index_seconds'], stale_indexes, 'wapo_passages', passage_index_generator.generate_index, args.passage_indexer_input_dir + "/wapo", args.indexer_output_dir + "/wapo_passages")
     
     if not args.skip_process_all:
-        #check if kilt has been processed, if not process it.
-        if not os.path.isfile("./data/processed_trecweb/kilt.trecweb"):
-            print("Processing KILT...")
-            kilt_trecweb_converter: KILTTrecwebConverter = KILTTrecwebConverter()
-            write_documents_to_file(args.kilt_collection, 'kilt', kilt_trecweb_converter, passage_chunker, 5903530, num_documents=args.document_count)
-        
-        #check if marco has been processed, if not process it.
-        if not os.path.isfile("./data/processed_trecweb/marco.trecweb"):
-            print("Processing Marco...")
-            marco_trecweb_converter: MarcoTrecwebConverter = MarcoTrecwebConverter()
-            write_documents_to_file(args.marco_collection, 'marco', marco_trecweb_converter, passage_chunker, 3213835, args.marco_duplicates, num_documents=args.document_count)
-        
-        #check if wapo has been processed, if not, process it
-        if not os.path.isfile("./data/processed_trecweb/wapo.trecweb"):
-            print("Processing WaPo...")
-            wapo_trecweb_converter: MarcoTrecwebConverter = MarcoTrecwebConverter()
-            write_documents_to_file(args.wapo_collection, 'marco', wapo_trecweb_converter, passage_chunker, 3213835, args.wapo_duplicates, num_documents=args.document_count)
+        #process any collection without a complete checkpoint, finished ones are skipped. With --no_resume
+        #every collection is converted again, except those already converted from scratch in this run
+        print("Processing KILT...")
+        kilt_trecweb_converter: KILTTrecwebConverter = KILTTrecwebConverter()
+        conversion_stats = write_documents_to_file(args.kilt_collection, 'kilt', kilt_trecweb_converter, passage_chunker, resume=not args.no_resume or 'kilt' in run_report['collections'], **conversion_options)
+        run_report['collections'].setdefault('kilt', conversion_stats.to_dict())
+        mark_stale(stale_indexes, 'kilt', conversion_stats)
 
-        
-        #no need to copy over files since directory has all we need
-        if not args.skip_indexing:
-            print("Indexing the entire collection...")
-            index_generator.generate_index(trecweb_dump_path, args.indexer_output_dir + "/all")  
+        print("Processing Marco...")
+        marco_trecweb_converter: MarcoTrecwebConverter = MarcoTrecwebConverter()
+        conversion_stats = write_documents_to_file(args.marco_collection, 'marco', marco_trecweb_converter, passage_chunker, args.marco_duplicates, resume=not args.no_resume or 'marco' in run_report['collections'], **conversion_options)
+        run_report['collections'].setdefault('marco', conversion_stats.to_dict())
+        mark_stale(stale_indexes, 'marco', conversion_stats)
 
+        print("Processing WaPo...")
+        wapo_trecweb_converter: WapoTrecwebConverter = WapoTrecwebConverter()
+        conversion_stats = write_documents_to_file(args.wapo_collection, 'wapo', wapo_trecweb_converter, passage_chunker, args.wapo_duplicates, resume=not args.no_resume or 'wapo' in run_report['collections'], **conversion_options)
+        run_report['collections'].setdefault('wapo', conversion_stats.to_dict())
+        mark_stale(stale_indexes, 'wapo', conversion_stats)
+
+        
+        #passage indexes are kept per collection, the searcher searches them together for ALL
+        if not args.skip_indexing and args.passage_index:
+            for collection_name in ['kilt', 'marco', 'wapo']:
+                passage_index = args.indexer_output_dir + "/" + collection_name + "_passages"
+                index_if_stale(run_report['index_seconds'], stale_indexes, collection_name + '_passages', passage_index_generator.generate_index, args.passage_indexer_input_dir + "/" + collection_name, passage_index)
 
+        #federated mode only needs the collection indexes, the searcher searches them together as ALL
+        if not args.skip_indexing and args.all_index_mode in ['merge', 'federated']:
+            collection_indexes = []
 
+            for collection_name in ['kilt', 'marco', 'wapo']:
+                collection_index = args.indexer_output_dir + "/" + collection_name
 
-        
+                index_if_stale(run_report['index_seconds'], stale_indexes, collection_name, index_generator.generate_index, args.indexer_input_dir + "/" + collection_name, collection_index)
 
+                #timings are only recorded for the indexes built in this run
+                if collection_name in run_report['index_seconds']:
+                    stale_indexes.add('all')
 
+                collection_indexes.append(collection_index)
 
+        #ALL is merged again only when one of the collection indexes was rebuilt in this run
+        if not args.skip_indexing and args.all_index_mode == 'merge':
+            index_if_stale(run_report['index_seconds'], stale_indexes, 'all', index_generator.merge_indexes, collection_indexes, args.indexer_output_dir + "/all")
 
+        #the input directory holds the files of every collection, in one sub-directory each
+        if not args.skip_indexing and args.all_index_mode == 'reindex':
+            index_if_stale(run_report['index_seconds'], stale_indexes, 'all', index_generator.generate_index, args.indexer_input_dir, args.indexer_output_dir + "/all")
 
+    run_report['peak_rss_mb'] = peak_rss_mb()
+    write_run_report(args.report_path, run_report)
+    print("Wrote the run report to {}".format(args.report_path))
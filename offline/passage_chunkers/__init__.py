@@ -1 +1,2 @@
-from .spacy_passage_chunker import SpacyPassageChunker
\ No newline at end of file
+from .spacy_passage_chunker import SpacyPassageChunker
+from .regex_passage_chunker import RegexPassageChunker
\ No newline at end of file
@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Dict, List
+from typing import Dict, Iterable, Iterator, List
 
 
 class AbstractPassageChunker(ABC):
@@ -8,7 +8,7 @@ class AbstractPassageChunker(ABC):
     def __init__(self, max_passage_size) -> None:
         self.document_sentences = None
         self.max_passage_size = max_passage_size
-    
+
     def tokenize_document(self, document_body) -> None:
         """
         Tokenizes the document into sentences
@@ -21,4 +21,52 @@ class AbstractPassageChunker(ABC):
         """
         pass
 
+    def chunk_documents(self, document_bodies: Iterable[str], stats = None) -> Iterator[List[Dict]]:
+        """
+        Creates the passage chunks for a stream of documents, yielding one
+        list of passages per document without keeping any instance state.
+        If stats is given, the time spent splitting sentences and packing
+        passages is added to its sentence_split and passage_packing stages.
+        """
+        pass
+
+    def pack_sentences(self, sentences: List[str], sentences_word_count: List[int]) -> List[Dict]:
+        """
+        Packs the sentences of a document into passages of roughly max_passage_size words
+        """
+
+        passages = []
+        sentence_count = len(sentences)
+
+        current_idx = 0
+        current_passage_word_count = 0
+        current_passage = ''
+        sub_id = 0
+
+        for i in range(sentence_count):
+
+            #0.67 is used to control passages that may overflow the max passage size
+            if current_passage_word_count >= (self.max_passage_size * 0.67):
+                passages.append({
+                    "body": current_passage,
+                    "id": sub_id
+                })
+
+                #reset the current passage to an empty string
+                current_passage = ''
+                current_passage_word_count = 0
+
+                current_idx = i
+                sub_id += 1
+
+            current_passage += sentences[i] + ' '
+            current_passage_word_count += sentences_word_count[i]
+
+        #append the remaining sentences, if any, to a passage
+        current_passage = ' '.join(sentences[current_idx:])
+        passages.append({
+            "body": current_passage,
+            "id": sub_id
+        })
 
+        return passages
@@ -0,0 +1,56 @@
+from .abstract_passage_chunker import AbstractPassageChunker
+from typing import Dict, Iterable, Iterator, List
+
+import re
+import time
+
+# a sentence ends at ., ! or ?, optionally followed by a closing quote or bracket,
+# when the next sentence starts with an uppercase letter, digit, quote or bracket
+SENTENCE_BOUNDARY = re.compile(r'(?:(?<=[.!?])|(?<=[.!?]["\'\)\]]))\s+(?=[A-Z0-9"\'\(\[])')
+
+# words and punctuation are counted separately, like spacy tokens
+TOKEN = re.compile(r'\w+|[^\w\s]')
+
+
+class RegexPassageChunker(AbstractPassageChunker):
+
+    def __init__(self, max_passage_size) -> None:
+        super().__init__(max_passage_size)
+
+
+    def split_sentences(self, document_body) -> List[str]:
+
+        document_body = document_body.strip()
+
+        if not document_body:
+            return []
+
+        return SENTENCE_BOUNDARY.split(document_body)
+
+
+    def tokenize_document(self, document_body) -> None:
+        self.document_sentences = self.split_sentences(document_body)
+
+
+    def chunk_document(self) -> List[Dict]:
+
+        sentences_word_count = [len(TOKEN.findall(sentence)) for sentence in self.document_sentences]
+
+        return self.pack_sentences(self.document_sentences, sentences_word_count)
+
+
+    def chunk_documents(self, document_bodies: Iterable[str], stats = None) -> Iterator[List[Dict]]:
+
+        for document_body in document_bodies:
+            start_time = time.perf_counter()
+            sentences = self.split_sentences(document_body)
+            split_time = time.perf_counter()
+
+            sentences_word_count = [len(TOKEN.findall(sentence)) for sentence in sentences]
+            passages = self.pack_sentences(sentences, sentences_word_count)
+
+            if stats:
+                stats.add_time('sentence_split', split_time - start_time)
+                stats.add_time('passage_packing', time.perf_counter() - split_time)
+
+            yield passages
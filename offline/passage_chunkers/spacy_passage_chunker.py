@@ -1,60 +1,74 @@
 from .abstract_passage_chunker import AbstractPassageChunker
-from typing import Dict, List
+from typing import Dict, Iterable, Iterator, List
+import time
 
-import spacy
+nlp = None
 
-nlp = spacy.load("en_core_web_sm", exclude=["parser", "tagger", "ner", "attribute_ruler", "lemmatizer", "tok2vec"])
-nlp.enable_pipe("senter")
-nlp.max_length = 1500000 #for documents that are longer than the spacy character limit
+def load_spacy_model():
+    """
+    Loads the sentence segmentation pipeline once per process, so that
+    importing this package does not require spacy or its model
+    """
+
+    global nlp
+
+    if nlp is None:
+        import spacy
+
+        nlp = spacy.load("en_core_web_sm", exclude=["parser", "tagger", "ner", "attribute_ruler", "lemmatizer", "tok2vec"])
+        nlp.enable_pipe("senter")
+        nlp.max_length = 1500000 #for documents that are longer than the spacy character limit
+
+    return nlp
 
 
 class SpacyPassageChunker(AbstractPassageChunker):
 
-    def __init__(self, max_passage_size) -> None:
+    def __init__(self, max_passage_size, batch_size = 32, n_process = 1) -> None:
         super().__init__(max_passage_size)
+        load_spacy_model()
+        self.batch_size = batch_size
+        self.n_process = n_process
+
 
-    
     def tokenize_document(self, document_body) -> None:
-        spacy_document = nlp(document_body)
+        spacy_document = load_spacy_model()(document_body)
         self.document_sentences = list(spacy_document.sents)
 
-    
+
     def chunk_document(self, passage_size = 250) -> List[Dict]:
 
-        passages = []
-        sentence_count = len(self.document_sentences)
+        sentences = [sentence.text for sentence in self.document_sentences]
         sentences_word_count = [len([token for token in sentence]) for sentence in self.document_sentences]
-        
-        current_idx = 0
-        current_passage_word_count = 0
-        current_passage = ''
-        sub_id = 0
-        
-        for i in range(sentence_count):
-
-            #0.67 is used to control passages that may overflow the max passage size
-            if current_passage_word_count >= (self.max_passage_size * 0.67):
-                passages.append({
-                    "body": current_passage,
-                    "id": sub_id
-                })
-
-                #reset the current passage to an empty string
-                current_passage = ''
-                current_passage_word_count = 0
-                
-                current_idx = i
-                sub_id += 1
-            
-            current_passage += self.document_sentences[i].text + ' '
-            current_passage_word_count += sentences_word_count[i]
-
-        #append the remaining sentences, if any, to a passage
-        current_passage = ' '.join(sentence.text for sentence in self.document_sentences[current_idx:])
-        passages.append({
-            "body": current_passage,
-            "id": sub_id
-        })
-        
-        return passages
-    
+
+        return self.pack_sentences(sentences, sentences_word_count)
+
+
+    def chunk_documents(self, document_bodies: Iterable[str], batch_size = None, n_process = None, stats = None) -> Iterator[List[Dict]]:
+
+        batch_size = batch_size or self.batch_size
+        n_process = n_process or self.n_process
+
+        spacy_documents = load_spacy_model().pipe(document_bodies, batch_size=batch_size, n_process=n_process)
+
+        while True:
+            start_time = time.perf_counter()
+
+            spacy_document = next(spacy_documents, None)
+            if spacy_document is None:
+                break
+
+            document_sentences = list(spacy_document.sents)
+            split_time = time.perf_counter()
+
+            sentences = [sentence.text for sentence in document_sentences]
+            sentences_word_count = [len(sentence) for sentence in document_sentences]
+
+            passages = self.pack_sentences(sentences, sentences_word_count)
+
+            if stats:
+                stats.add_time('sentence_split', split_time - start_time)
+                stats.add_time('passage_packing', time.perf_counter() - split_time)
+
+            yield passages
+
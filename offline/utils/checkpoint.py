@@ -0,0 +1,100 @@
+from typing import Dict
+import hashlib
+import json
+import os
+
+
+def file_fingerprint(file_path: str) -> Dict:
+
+    """
+    Cheap identity of an input file, its size and modification time
+    """
+
+    if not file_path or not os.path.isfile(file_path):
+        return None
+
+    file_stat = os.stat(file_path)
+    return {'path': os.path.abspath(file_path), 'size': file_stat.st_size, 'mtime': file_stat.st_mtime_ns}
+
+class BuildCheckpoint:
+
+    """
+    Manifest recording how far the conversion of a collection got. It holds the
+    input byte offset, the position reached in the output shards (and in the
+    document store and passage shards, if they are written) and the number
+    of documents emitted, along with a hash of the inputs and the converter and
+    chunker settings. A rerun with the same hash resumes from the recorded
+    positions, a finished one is skipped.
+    """
+
+    def __init__(self, manifest_path: str, settings: Dict) -> None:
+        self.manifest_path = manifest_path
+        self.settings = settings
+        self.settings_hash = hashlib.sha256(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()
+        self.reset()
+
+    def reset(self) -> None:
+        self.input_offset = 0
+        self.output_position = None
+        self.docstore_position = None
+        self.passage_output_position = None
+        self.documents_emitted = 0
+        self.first_copies_seen = []
+        self.complete = False
+
+    def load(self) -> bool:
+
+        """
+        Restores the progress of a previous run. Returns False, and starts from
+        scratch, if there is no manifest or it was written with other settings.
+        """
+
+        self.reset()
+
+        if not os.path.isfile(self.manifest_path):
+            return False
+
+        try:
+            with open(self.manifest_path) as manifest_file:
+                manifest = json.load(manifest_file)
+        except ValueError:
+            return False
+
+        if manifest.get('settings_hash') != self.settings_hash:
+            return False
+
+        self.input_offset = manifest['input_offset']
+        self.output_position = manifest['output_position']
+        self.docstore_position = manifest.get('docstore_position')
+        self.passage_output_position = manifest.get('passage_output_position')
+        self.documents_emitted = manifest['documents_emitted']
+        self.first_copies_seen = manifest['first_copies_seen']
+        self.complete = manifest['complete']
+
+        return True
+
+    def save(self) -> None:
+
+        """
+        Atomically writes the manifest, so that a crash mid-write leaves the previous one intact
+        """
+
+        manifest = {
+            'settings': self.settings,
+            'settings_hash': self.settings_hash,
+            'input_offset': self.input_offset,
+            'output_position': self.output_position,
+            'docstore_position': self.docstore_position,
+            'passage_output_position': self.passage_output_position,
+            'documents_emitted': self.documents_emitted,
+            'first_copies_seen': self.first_copies_seen,
+            'complete': self.complete
+        }
+
+        temporary_path = self.manifest_path + '.tmp'
+        with open(temporary_path, 'w') as manifest_file:
+            json.dump(manifest, manifest_file)
+            manifest_file.flush()
+            os.fsync(manifest_file.fileno())
+
+        os.replace(temporary_path, self.manifest_path)
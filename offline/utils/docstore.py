@@ -0,0 +1,130 @@
+from typing import Dict
+import os
+import struct
+
+# layout of the index file, read by the searcher's Docstore
+MAGIC = b'DOCSTR01'
+# magic, key width, key count
+HEADER = struct.Struct('<8sIQ')
+# byte offset and length of a record in the data file
+LOCATION = struct.Struct('<QI')
+
+
+class DocstoreWriter:
+
+    """
+    Writes a document store for a collection, which the searcher serves full
+    documents from without going through Lucene. Records are appended to
+    {collection}.data.tmp, one JSON document with its passages per line, and
+    their ids and locations to the {collection}.offsets sidecar.
+
+    Once the collection is complete, build_index() sorts the sidecar into
+    {collection}.index: a header, the sorted, NUL padded, fixed-width document
+    ids and then the (offset, length) of each record, which the searcher memory
+    maps and looks ids up in with a binary search. The data and index files then
+    replace those of the previous build, which are never modified in place, so a
+    searcher that has them mapped keeps reading the old store.
+
+    Like the ShardedWriter, a position can be recorded with checkpoint() and restored later.
+    """
+
+    def __init__(self, directory: str, collection_name: str) -> None:
+        self.data_path = os.path.join(directory, collection_name + '.data')
+        self.partial_data_path = self.data_path + '.tmp'
+        self.offsets_path = os.path.join(directory, collection_name + '.offsets')
+        self.index_path = os.path.join(directory, collection_name + '.index')
+
+        self.data_file = None
+        self.offsets_file = None
+
+        os.makedirs(directory, exist_ok=True)
+
+    def can_restore(self, position: Dict, complete: bool = False) -> bool:
+
+        """
+        Checks that the files written up to a position, or the data and index of a complete store, are still on disk
+        """
+
+        if not position:
+            return True
+
+        if complete and not os.path.isfile(self.index_path):
+            return False
+
+        data_path = self.data_path if complete else self.partial_data_path
+
+        for file_path, size in [(data_path, position['data_bytes']), (self.offsets_path, position['offsets_bytes'])]:
+            if not os.path.isfile(file_path) or os.path.getsize(file_path) < size:
+                return False
+
+        return True
+
+    def restore(self, position: Dict = None) -> None:
+
+        """
+        Opens the writer at a recorded position, dropping anything written after it. The store of the previous build is left as it is.
+        """
+
+        position = position or {'data_bytes': 0, 'offsets_bytes': 0}
+
+        self.data_file = open(self.partial_data_path, 'ab')
+        self.data_file.truncate(position['data_bytes'])
+        self.data_file.seek(position['data_bytes'])
+
+        self.offsets_file = open(self.offsets_path, 'ab')
+        self.offsets_file.truncate(position['offsets_bytes'])
+        self.offsets_file.seek(position['offsets_bytes'])
+
+    def write(self, doc_id: str, record: bytes) -> None:
+        offset = self.data_file.tell()
+        self.data_file.write(record)
+        self.offsets_file.write('{}\t{}\t{}\n'.format(doc_id, offset, len(record)).encode('utf-8'))
+
+    def checkpoint(self) -> Dict:
+
+        """
+        Makes everything written so far durable and returns the current position
+        """
+
+        for file in [self.data_file, self.offsets_file]:
+            file.flush()
+            os.fsync(file.fileno())
+
+        return {'data_bytes': self.data_file.tell(), 'offsets_bytes': self.offsets_file.tell()}
+
+    def close(self) -> Dict:
+        position = self.checkpoint()
+        self.data_file.close()
+        self.offsets_file.close()
+        self.data_file = None
+        self.offsets_file = None
+        return position
+
+    def build_index(self) -> None:
+
+        """
+        Sorts the sidecar into the index file and replaces the data and index of the previous build with the new ones.
+        The first record of an id that was written twice is kept.
+        """
+
+        locations = {}
+
+        with open(self.offsets_path, 'rb') as offsets_file:
+            for line in offsets_file:
+                doc_id, offset, length = line.rstrip(b'\n').rsplit(b'\t', 2)
+                locations.setdefault(doc_id, (int(offset), int(length)))
+
+        key_width = max((len(doc_id) for doc_id in locations), default=1)
+        keys = sorted(locations)
+
+        temporary_path = self.index_path + '.tmp'
+        with open(temporary_path, 'wb') as index_file:
+            index_file.write(HEADER.pack(MAGIC, key_width, len(keys)))
+            index_file.write(b''.join(key.ljust(key_width, b'\0') for key in keys))
+            index_file.write(b''.join(LOCATION.pack(*locations[key]) for key in keys))
+            index_file.flush()
+            os.fsync(index_file.fileno())
+
+        # the searcher reads both files at startup only, files it has mapped stay readable after being replaced
+        os.replace(self.partial_data_path, self.data_path)
+        os.replace(temporary_path, self.index_path)
@@ -0,0 +1,106 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict
+import json
+import resource
+import time
+
+# stages of the pipeline, in the order a document goes through them
+STAGES = ['read', 'parse', 'dedup', 'sentence_split', 'passage_packing', 'serialise', 'write', 'index']
+
+# width, in words, of the buckets of the passage length histogram
+PASSAGE_LENGTH_BUCKET = 25
+
+
+class StageStats:
+
+    """
+    Time spent in each stage of the pipeline along with document and passage counters.
+    Workers fill in their own StageStats for every batch, which the parent merges.
+    """
+
+    def __init__(self) -> None:
+        self.seconds = defaultdict(float)
+        self.counters = defaultdict(int)
+        self.passage_lengths = defaultdict(int)
+        self.wall_seconds = 0.0
+        self.status = None
+        # peak resident memory of the processes that converted the batches
+        self.converter_peak_rss_mb = 0.0
+
+    @contextmanager
+    def timed(self, stage: str):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[stage] += time.perf_counter() - start_time
+
+    def add_time(self, stage: str, seconds: float) -> None:
+        self.seconds[stage] += seconds
+
+    def count(self, counter: str, amount: int = 1) -> None:
+        self.counters[counter] += amount
+
+    def record_peak_rss(self) -> None:
+
+        """
+        Records the peak resident memory of the process converting a batch, a worker or the pipeline itself
+        """
+
+        self.converter_peak_rss_mb = max(self.converter_peak_rss_mb, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
+
+    def record_passage(self, word_count: int) -> None:
+        self.passage_lengths[word_count // PASSAGE_LENGTH_BUCKET * PASSAGE_LENGTH_BUCKET] += 1
+
+    def merge(self, other: 'StageStats') -> None:
+        for stage, seconds in other.seconds.items():
+            self.seconds[stage] += seconds
+        for counter, amount in other.counters.items():
+            self.counters[counter] += amount
+        for bucket, amount in other.passage_lengths.items():
+            self.passage_lengths[bucket] += amount
+        self.converter_peak_rss_mb = max(self.converter_peak_rss_mb, other.converter_peak_rss_mb)
+
+    def to_dict(self) -> Dict:
+
+        """
+        Machine-readable summary. Stage times of workers are summed over all of
+        them, so with several workers they can add up to more than the wall time.
+        """
+
+        documents_written = self.counters.get('documents_written', 0)
+        documents_chunked = self.counters.get('documents_chunked', 0)
+        passages = self.counters.get('passages', 0)
+
+        return {
+            'status': self.status,
+            'wall_seconds': self.wall_seconds,
+            'docs_per_second': documents_written / self.wall_seconds if self.wall_seconds else None,
+            'passages_per_document': passages / documents_chunked if documents_chunked else None,
+            'converter_peak_rss_mb': self.converter_peak_rss_mb or None,
+            'stage_seconds': {stage: self.seconds[stage] for stage in STAGES if stage in self.seconds},
+            'counters': dict(self.counters),
+            'passage_length_histogram': {
+                '{}-{}'.format(bucket, bucket + PASSAGE_LENGTH_BUCKET - 1): self.passage_lengths[bucket]
+                for bucket in sorted(self.passage_lengths)
+            }
+        }
+
+def peak_rss_mb() -> Dict:
+
+    """
+    Peak resident memory of this process and of the largest of its finished child processes.
+    Children include the indexing subprocesses, the conversion workers are reported per
+    collection as converter_peak_rss_mb.
+    """
+
+    # ru_maxrss is in kilobytes on Linux
+    return {
+        'pipeline': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'largest_child_process': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    }
+
+def write_run_report(report_path: str, report: Dict) -> None:
+    with open(report_path, 'w') as report_file:
+        json.dump(report, report_file, indent=4)
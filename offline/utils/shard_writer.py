@@ -0,0 +1,125 @@
+from typing import Dict
+import gzip
+import os
+
+
+class ShardedWriter:
+
+    """
+    Writes entries to a directory of size-bounded shards, {prefix}_00000{extension},
+    optionally gzip compressed. Anserini indexes one file per thread, so sharding
+    lets indexing use all of its threads on the files in place.
+
+    A position (shard, byte offset) can be recorded with checkpoint() and restored
+    later. With compression, every checkpoint ends a gzip member, so the recorded
+    offset is always a valid place to truncate and append new members.
+    """
+
+    def __init__(self, directory: str, prefix: str, extension: str, max_shard_bytes: int, compress: bool = False, compresslevel: int = 1) -> None:
+        self.directory = directory
+        self.prefix = prefix
+        self.extension = extension + ('.gz' if compress else '')
+        self.max_shard_bytes = max_shard_bytes
+        self.compress = compress
+        self.compresslevel = compresslevel
+
+        self.shard = 0
+        self.shard_bytes = 0
+        self.raw_file = None
+        self.file = None
+
+        os.makedirs(directory, exist_ok=True)
+
+    def shard_path(self, shard: int) -> str:
+        return os.path.join(self.directory, '{}_{:05d}{}'.format(self.prefix, shard, self.extension))
+
+    def can_restore(self, position: Dict) -> bool:
+
+        """
+        Checks that the shards written up to a position are all still on disk
+        """
+
+        if not position:
+            return True
+
+        for shard in range(position['shard']):
+            if not os.path.isfile(self.shard_path(shard)):
+                return False
+
+        shard_path = self.shard_path(position['shard'])
+        shard_size = os.path.getsize(shard_path) if os.path.isfile(shard_path) else 0
+
+        return shard_size >= position['offset']
+
+    def restore(self, position: Dict = None) -> None:
+
+        """
+        Opens the writer at a recorded position, dropping anything written after it.
+        Without a position, every existing shard is removed and writing starts afresh.
+        """
+
+        position = position or {'shard': 0, 'offset': 0, 'shard_bytes': 0}
+
+        kept_shards = {os.path.basename(self.shard_path(shard)) for shard in range(position['shard'] + 1)}
+        for file_name in os.listdir(self.directory):
+            if file_name.startswith(self.prefix + '_') and file_name not in kept_shards:
+                os.remove(os.path.join(self.directory, file_name))
+
+        self.shard = position['shard']
+        self.shard_bytes = position['shard_bytes']
+        self.__open_shard()
+        self.raw_file.truncate(position['offset'])
+        self.raw_file.seek(position['offset'])
+        self.__open_stream()
+
+    def write(self, entry: bytes) -> None:
+
+        if self.shard_bytes >= self.max_shard_bytes:
+            self.close()
+            self.shard += 1
+            self.shard_bytes = 0
+            self.__open_shard()
+            self.__open_stream()
+
+        self.file.write(entry)
+        self.shard_bytes += len(entry)
+
+    def checkpoint(self) -> Dict:
+
+        """
+        Makes everything written so far durable and returns the current position
+        """
+
+        position = self.__flush()
+
+        if self.compress:
+            self.__open_stream()
+
+        return position
+
+    def close(self) -> Dict:
+        position = self.__flush()
+        self.raw_file.close()
+        self.file = None
+        self.raw_file = None
+        return position
+
+    def __open_shard(self) -> None:
+        self.raw_file = open(self.shard_path(self.shard), 'ab')
+
+    def __open_stream(self) -> None:
+        if self.compress:
+            self.file = gzip.GzipFile(fileobj=self.raw_file, mode='ab', compresslevel=self.compresslevel)
+        else:
+            self.file = self.raw_file
+
+    def __flush(self) -> Dict:
+
+        if self.compress:
+            # ends the current gzip member, leaving the shard open
+            self.file.close()
+
+        self.raw_file.flush()
+        os.fsync(self.raw_file.fileno())
+
+        return {'shard': self.shard, 'offset': self.raw_file.tell(), 'shard_bytes': self.shard_bytes}
@@ -1,6 +1,16 @@
-from typing import Dict, List
+from typing import Dict, Iterator, List, Tuple
+from multiprocessing import Pool
+import json
+import os
+import time
+from threading import BoundedSemaphore, Event
 from tqdm import tqdm
 
+from .checkpoint import BuildCheckpoint, file_fingerprint
+from .docstore import DocstoreWriter
+from .shard_writer import ShardedWriter
+from .run_report import StageStats
+
 def add_passage_ids(passages: List) -> str:
 
     """
@@ -45,52 +55,416 @@ def create_trecweb_entry(idx: str, url: str, title: str, body: str) -> str:
     
     return content
 
-def write_documents_to_file(collection_path: str, collection_name : str, converter, passage_chunker, document_count: int, duplicates_file_path: str = None, num_documents = None):
+def create_json_entry(idx: str, url: str, title: str, passages: List) -> str:
+
+    """
+    Creates a Pyserini JsonCollection entry for a document. The passage text is
+    indexed through contents and the passages are kept as structured JSON in the
+    stored raw document, so the searcher does not have to parse any markup.
+    """
+
+    document = {
+        'id': idx,
+        'contents': '\n'.join([title] + [passage["body"] for passage in passages]),
+        'title': title,
+        'url': url,
+        'passages': [{'id': passage["id"], 'body': passage["body"]} for passage in passages]
+    }
+
+    return json.dumps(document, ensure_ascii=False) + '\n'
+
+def create_docstore_record(idx: str, url: str, title: str, passages: List) -> str:
+
+    """
+    Creates the document store record of a document, one line of JSON with its passages
+    """
+
+    document = {
+        'id': idx,
+        'url': url,
+        'title': title,
+        'passages': [{'id': str(passage["id"]), 'body': passage["body"]} for passage in passages]
+    }
+
+    return json.dumps(document, ensure_ascii=False) + '\n'
+
+def create_passage_entries(idx: str, url: str, title: str, passages: List) -> str:
+
+    """
+    Creates a Pyserini JsonCollection entry for each passage of a document, with
+    ids of the form DOCID-passageid, for the passage-level index. The title is
+    indexed along with every passage.
+    """
+
+    entries = ''
+
+    for passage in passages:
+        entries += json.dumps({
+            'id': '{}-{}'.format(idx, passage["id"]),
+            'contents': title + '\n' + passage["body"],
+            'doc_id': idx,
+            'passage_id': str(passage["id"]),
+            'url': url,
+            'title': title,
+            'body': passage["body"]
+        }, ensure_ascii=False) + '\n'
+
+    return entries
+
+# file extension of the processed files for each index format
+INDEX_FORMAT_EXTENSIONS = {
+    'trecweb': '.trecweb',
+    'json': '.jsonl'
+}
+
+def create_entry(index_format: str, idx: str, url: str, title: str, passages: List) -> str:
+
+    """
+    Serialises a document in the format of the index it will be added to
+    """
+
+    if index_format == 'json':
+        return create_json_entry(idx, url, title, passages)
+
+    return create_trecweb_entry(idx, url, title, add_passage_ids(passages))
+
+def index_exists(index_directory: str) -> bool:
+
+    """
+    Checks if a Lucene index has been committed to a directory
+    """
+
+    if not os.path.isdir(index_directory):
+        return False
+
+    return any(file_name.startswith('segments_') for file_name in os.listdir(index_directory))
+
+def is_duplicate(doc_id: str, collection_name: str, duplicates_lookup_dict: Dict, first_copies_seen: List[str] = None) -> bool:
+
+    """
+    Checks a document against the duplicates lookup. For WaPo, the first copy
+    of a document (value 2) is kept and every later copy is marked as a duplicate.
+    """
+
+    if duplicates_lookup_dict and collection_name == 'marco':
+        if doc_id in duplicates_lookup_dict:
+            #print("{} is a duplicate in the Marco collection!".format(doc_id))
+            return True
+
+    if duplicates_lookup_dict and collection_name == 'wapo':
+
+        if duplicates_lookup_dict.get(doc_id) == 1:
+            #print("{} is a duplicate in the WaPo collection!".format(doc_id))
+            return True
+
+        if duplicates_lookup_dict.get(doc_id) == 2:
+            #print("Processed the first copy of {} in the WaPo collection!".format(doc_id))
+            duplicates_lookup_dict[doc_id] = 1
+
+            if first_copies_seen is not None:
+                first_copies_seen.append(doc_id)
+
+    return False
+
+def convert_documents(lines: List[bytes], converter, passage_chunker, duplicates_lookup_dict: Dict = None, index_format: str = 'trecweb', docstore: bool = False,
+                      passage_index: bool = False) -> Tuple[List[Tuple[str, str, str, str]], StageStats]:
 
     """
-    Single interface to write documents to the final trecweb file.
+    Converts a batch of raw collection lines to (doc_id, entry, docstore record, passage entries)
+    tuples, with the entry serialised in the given index format. The record is None unless
+    docstore is set and the passage entries are None unless passage_index is set.
+    Documents that are always duplicates are dropped here, the stateful WaPo
+    first-copy check is left to the caller so it happens in input order.
+    Also returns the time spent in each stage and the document and passage counts of the batch.
     """
 
-    count = 0
+    stats = StageStats()
+    stats.count('lines_read', len(lines))
+
+    documents = []
+
+    #documents without all of their fields are skipped by the converter, see Marco converter
+    parsed_documents = converter.iter_documents(lines)
+
+    while True:
+        with stats.timed('parse'):
+            document_attributes = next(parsed_documents, None)
+
+        if document_attributes is None:
+            break
+
+        with stats.timed('dedup'):
+            duplicate = duplicates_lookup_dict and duplicates_lookup_dict.get(document_attributes[0]) == 1
+
+        if duplicate:
+            stats.count('duplicates_skipped')
+            continue
+
+        documents.append(document_attributes)
+
+    stats.count('documents_parsed', len(documents) + stats.counters['duplicates_skipped'])
+
+    stats.count('documents_chunked', len(documents))
+
+    converted_documents = []
+    document_bodies = (doc_body for _, _, _, doc_body in documents)
+
+    for (doc_id, doc_url, doc_title, _), passages in zip(documents, passage_chunker.chunk_documents(document_bodies, stats=stats)):
+        with stats.timed('serialise'):
+            entry = create_entry(index_format, doc_id, doc_url, doc_title, passages)
+            record = create_docstore_record(doc_id, doc_url, doc_title, passages) if docstore else None
+            passage_entries = create_passage_entries(doc_id, doc_url, doc_title, passages) if passage_index else None
+            converted_documents.append((doc_id, entry, record, passage_entries))
+
+        stats.count('passages', len(passages))
+        for passage in passages:
+            stats.record_passage(len(passage["body"].split()))
+
+    stats.record_peak_rss()
+
+    return converted_documents, stats
+
+_worker_state = {}
+
+def _init_worker(converter, passage_chunker, duplicates_lookup_dict: Dict, index_format: str, docstore: bool, passage_index: bool) -> None:
+    _worker_state['converter'] = converter
+    _worker_state['passage_chunker'] = passage_chunker
+    _worker_state['duplicates_lookup_dict'] = duplicates_lookup_dict
+    _worker_state['index_format'] = index_format
+    _worker_state['docstore'] = docstore
+    _worker_state['passage_index'] = passage_index
+
+def _convert_documents_in_worker(batch: Tuple[List[bytes], int]) -> Tuple[int, List[Tuple[str, str, str, str]], StageStats]:
+    lines, end_offset = batch
+    converted_documents, stats = convert_documents(lines, _worker_state['converter'],
+        _worker_state['passage_chunker'], _worker_state['duplicates_lookup_dict'], _worker_state['index_format'], _worker_state['docstore'], _worker_state['passage_index'])
+    return end_offset, converted_documents, stats
+
+def read_batches(collection, batch_size: int, in_flight: BoundedSemaphore = None, stop: Event = None, stats: StageStats = None) -> Iterator[Tuple[List[bytes], int]]:
+
+    """
+    Groups the lines of a collection, opened in binary mode, into batches along with
+    the byte offset at which each batch ends. If a semaphore is given, it is acquired
+    before each batch so that a process pool cannot read ahead of the writer.
+    """
+
+    def wait_for_slot() -> bool:
+        if not in_flight:
+            return True
+        while not in_flight.acquire(timeout=1):
+            if stop and stop.is_set():
+                return False
+        return True
+
+    offset = collection.tell()
+    batch = []
+    start_time = time.perf_counter()
+    for line in collection:
+        batch.append(line)
+        offset += len(line)
+
+        if len(batch) >= batch_size:
+            if stats:
+                stats.add_time('read', time.perf_counter() - start_time)
+            if not wait_for_slot():
+                return
+            yield batch, offset
+            batch = []
+            start_time = time.perf_counter()
+
+    if stats:
+        stats.add_time('read', time.perf_counter() - start_time)
+
+    if batch and wait_for_slot():
+        yield batch, offset
+
+def build_settings(collection_path: str, converter, passage_chunker, duplicates_file_path: str = None, num_documents = None, shard_size: int = None, compress: bool = False, index_format: str = 'trecweb', docstore_directory: str = None, passage_directory: str = None) -> Dict:
+
+    """
+    Everything that affects the output of a collection, used to decide if a checkpoint is still valid
+    """
+
+    return {
+        'collection': file_fingerprint(collection_path),
+        'duplicates': file_fingerprint(duplicates_file_path),
+        'converter': type(converter).__name__,
+        'passage_chunker': type(passage_chunker).__name__,
+        'max_passage_size': passage_chunker.max_passage_size,
+        'num_documents': num_documents,
+        'shard_size': shard_size,
+        'compress': compress,
+        'index_format': index_format,
+        'docstore_directory': os.path.abspath(docstore_directory) if docstore_directory else None,
+        'passage_directory': os.path.abspath(passage_directory) if passage_directory else None
+    }
+
+def write_documents_to_file(collection_path: str, collection_name : str, converter, passage_chunker, duplicates_file_path: str = None, num_documents = None, workers: int = 1, batch_size: int = 64, resume: bool = True, checkpoint_interval: int = 10000,
+                            output_directory: str = './data/index_candidates', checkpoint_directory: str = './data/checkpoints', shard_size: int = 256 * 1024 * 1024, compress: bool = False, index_format: str = 'trecweb', docstore_directory: str = None, passage_directory: str = None) -> StageStats:
+
+    """
+    Single interface to write documents to the final trecweb (or json) files.
+    Documents are written to size-bounded shards in output_directory/collection_name,
+    which the index generator reads in place.
+    With more than one worker, batches of lines are converted on a process pool
+    and written back in input order, so the output does not depend on scheduling.
+    Progress is checkpointed every checkpoint_interval documents, an interrupted
+    run resumes from the last checkpoint and a finished one is skipped.
+    If docstore_directory is set, a document store of the collection is written there too.
+    If passage_directory is set, every passage is also written as a document of its own
+    to json shards in passage_directory/collection_name, to build a passage-level index from.
+    Returns the time spent in each stage along with document and passage counts.
+    """
+
+    stats = StageStats()
+    start_time = time.perf_counter()
+
+    os.makedirs(checkpoint_directory, exist_ok=True)
+
+    document_writer = ShardedWriter(os.path.join(output_directory, collection_name), collection_name, INDEX_FORMAT_EXTENSIONS[index_format], shard_size, compress)
+    docstore_writer = DocstoreWriter(docstore_directory, collection_name) if docstore_directory else None
+    passage_writer = ShardedWriter(os.path.join(passage_directory, collection_name), collection_name + '_passages', INDEX_FORMAT_EXTENSIONS['json'], shard_size, compress) if passage_directory else None
+
+    checkpoint = BuildCheckpoint(os.path.join(checkpoint_directory, collection_name + '.json'),
+        build_settings(collection_path, converter, passage_chunker, duplicates_file_path, num_documents, shard_size, compress, index_format, docstore_directory, passage_directory))
+
+    resumed = resume and checkpoint.load()
+
+    if resumed and not (document_writer.can_restore(checkpoint.output_position)
+                        and (not docstore_writer or docstore_writer.can_restore(checkpoint.docstore_position, checkpoint.complete))
+                        and (not passage_writer or passage_writer.can_restore(checkpoint.passage_output_position))):
+        # shards or document store files were removed or truncated after the checkpoint was written
+        checkpoint.reset()
+        resumed = False
+
+    if resumed:
+        if checkpoint.complete:
+            print("{} is up to date, skipping".format(collection_name))
+            stats.status = 'up_to_date'
+            return stats
+
+        print("Resuming {} from document {}".format(collection_name, checkpoint.documents_emitted))
+        stats.status = 'resumed'
+    else:
+        stats.status = 'converted'
+
+    count = checkpoint.documents_emitted
+    if num_documents and count >= num_documents:
+        checkpoint.complete = True
+        checkpoint.save()
+        return stats
 
     duplicates_lookup_dict = None
     if duplicates_file_path:
-        duplicates_lookup_dict = converter.create_duplicates_dictionary(duplicates_file_path)
-
-    with open(collection_path, 'r') as collection:
-        with open('./data/processed_trecweb/' + collection_name + ".trecweb", 'a') as trecweb_file:
-            for document in tqdm(collection, total=document_count):
-
-                if not converter.get_document_attributes(document):
-                    #skipping because we do not have all the fields for this doc, see Marco converter
-                    continue
-
-                doc_id, doc_url, doc_title, doc_body = converter.get_document_attributes(document)
-
-                if duplicates_lookup_dict and collection_name == 'marco':
-                    if doc_id in duplicates_lookup_dict:
-                        #print("{} is a duplicate in the Marco collection!".format(doc_id))
-                        continue
-                
-                if duplicates_lookup_dict and collection_name == 'wapo':
-
-                    if duplicates_lookup_dict.get(doc_id) == 1:
-                        #print("{} is a duplicate in the WaPo collection!".format(doc_id))
-                        continue
-
-                    if duplicates_lookup_dict.get(doc_id) == 2:
-                        #print("Processed the first copy of {} in the WaPo collection!".format(doc_id))
-                        duplicates_lookup_dict[doc_id] = 1
-                
-                passage_chunker.tokenize_document(doc_body)
-                passages = passage_chunker.chunk_document()
-                passage_splits = add_passage_ids(passages)
-                trecweb_entry = create_trecweb_entry(doc_id, doc_url, doc_title, passage_splits)
-                trecweb_file.write(trecweb_entry)
-
-                
-                if num_documents:
-                    # process only the user specified number of documents
-                    count += 1
-                    if count >= num_documents:
-                        break
\ No newline at end of file
+        duplicates_lookup_dict = converter.load_duplicates_index(duplicates_file_path)
+
+        for doc_id in checkpoint.first_copies_seen:
+            duplicates_lookup_dict[doc_id] = 1
+
+    pool = None
+    in_flight = None
+    stop = Event()
+
+    # drop anything written after the last checkpoint
+    document_writer.restore(checkpoint.output_position)
+    if docstore_writer:
+        docstore_writer.restore(checkpoint.docstore_position)
+    if passage_writer:
+        passage_writer.restore(checkpoint.passage_output_position)
+
+    with open(collection_path, 'rb') as collection:
+        collection.seek(checkpoint.input_offset)
+
+        if workers > 1:
+            # bound the number of batches waiting to be written
+            in_flight = BoundedSemaphore(workers * 4)
+            pool = Pool(workers, initializer=_init_worker, initargs=(converter, passage_chunker, duplicates_lookup_dict, index_format, bool(docstore_writer), bool(passage_writer)))
+            converted_batches = pool.imap(_convert_documents_in_worker, read_batches(collection, batch_size, in_flight, stop, stats))
+        else:
+            converted_batches = ((end_offset, *convert_documents(lines, converter, passage_chunker, duplicates_lookup_dict, index_format, bool(docstore_writer), bool(passage_writer)))
+                for lines, end_offset in read_batches(collection, batch_size, stats=stats))
+
+        def save_checkpoint(complete: bool = False) -> None:
+            with stats.timed('write'):
+                checkpoint.output_position = document_writer.close() if complete else document_writer.checkpoint()
+
+                if docstore_writer:
+                    checkpoint.docstore_position = docstore_writer.close() if complete else docstore_writer.checkpoint()
+
+                    if complete:
+                        docstore_writer.build_index()
+
+                if passage_writer:
+                    checkpoint.passage_output_position = passage_writer.close() if complete else passage_writer.checkpoint()
+
+                checkpoint.documents_emitted = count
+                checkpoint.complete = complete
+                checkpoint.save()
+
+        # progress is measured in documents when only some are converted, otherwise in bytes read
+        if num_documents:
+            progress_bar = tqdm(total=num_documents, initial=count, unit='docs')
+        else:
+            collection_size = os.path.getsize(collection_path)
+            progress_bar = tqdm(total=collection_size, initial=checkpoint.input_offset, unit='B', unit_scale=True)
+
+        try:
+            last_checkpoint_count = count
+            limit_reached = False
+
+            with progress_bar:
+                for end_offset, converted_documents, batch_stats in converted_batches:
+                    if in_flight:
+                        in_flight.release()
+                    stats.merge(batch_stats)
+
+                    for doc_id, entry, record, passage_entries in converted_documents:
+
+                        with stats.timed('dedup'):
+                            duplicate = is_duplicate(doc_id, collection_name, duplicates_lookup_dict, checkpoint.first_copies_seen)
+
+                        if duplicate:
+                            stats.count('duplicates_skipped')
+                            continue
+
+                        with stats.timed('write'):
+                            encoded_entry = entry.encode('utf-8')
+                            document_writer.write(encoded_entry)
+
+                            if docstore_writer:
+                                docstore_writer.write(doc_id, record.encode('utf-8'))
+
+                            if passage_writer:
+                                passage_writer.write(passage_entries.encode('utf-8'))
+
+                        count += 1
+                        stats.count('documents_written')
+                        stats.count('bytes_written', len(encoded_entry))
+
+                        if num_documents:
+                            progress_bar.update(1)
+
+                            if count >= num_documents:
+                                # process only the user specified number of documents
+                                limit_reached = True
+                                break
+
+                    if limit_reached:
+                        break
+
+                    if not num_documents:
+                        progress_bar.update(end_offset - checkpoint.input_offset)
+                    checkpoint.input_offset = end_offset
+
+                    if count - last_checkpoint_count >= checkpoint_interval:
+                        save_checkpoint()
+                        last_checkpoint_count = count
+
+            save_checkpoint(complete=True)
+        finally:
+            stop.set()
+            if pool:
+                pool.terminate()
+                pool.join()
+
+    stats.wall_seconds = time.perf_counter() - start_time
+    return stats
@@ -0,0 +1,124 @@
+import sys
+
+sys.path.insert(0, '/shared')
+sys.path.insert(0, '/shared/compiled_protobufs')
+
+import argparse
+import json
+import time
+from typing import Dict, List
+
+from rerankers.onnx_scorer import OnnxScorer
+from rerankers.passage_scorer import MonoT5Scorer, MonoBERTScorer
+from rerankers.pygaggle import MonoT5, MonoBERT
+
+parser = argparse.ArgumentParser(description='Compares the rankings of the ONNX Runtime backend against the PyTorch models')
+parser.add_argument('--input', type=str, required=True, help="JSON lines of {\"query\", \"passages\": [body]} or {\"query\", \"documents\"}, as downloaded from the web ui")
+parser.add_argument('--models', type=str, default="T5,BERT", help="Comma separated models to compare")
+parser.add_argument('--onnx_directory', type=str, default="/shared/onnx_models", help="Directory the exported models are kept in")
+parser.add_argument('--quantize', default=False, action='store_true', help="Compare the int8 quantised models")
+parser.add_argument('--batch_size', type=int, default=8, help="Passages per forward pass")
+parser.add_argument('--max_length', type=int, default=512, help="Maximum tokens of a query and passage pair")
+parser.add_argument('--intra_op_threads', type=int, default=0, help="ONNX Runtime intra-op threads, 0 for its default")
+parser.add_argument('--inter_op_threads', type=int, default=0, help="ONNX Runtime inter-op threads, 0 for its default")
+parser.add_argument('--top_k', type=int, default=10, help="Depth of the top-k overlap")
+parser.add_argument('--report_path', type=str, default=None, help="Where to also write the report as JSON")
+
+scorer_classes = {
+    'T5': (MonoT5Scorer, MonoT5),
+    'BERT': (MonoBERTScorer, MonoBERT)
+}
+
+def read_queries(input_path: str) -> List[Dict]:
+
+    queries = []
+
+    with open(input_path) as input_file:
+        for line in input_file:
+            if not line.strip():
+                continue
+
+            query = json.loads(line)
+
+            if 'documents' in query:
+                query['passages'] = [passage['body'] for document in query['documents'] for passage in document.get('passages', [])]
+
+            queries.append({'query': query['query'], 'passages': query['passages']})
+
+    return queries
+
+def score_queries(scorer, queries: List[Dict]):
+
+    """
+    Scores the passages of every query, returning the scores and how long scoring took
+    """
+
+    start_time = time.perf_counter()
+    scores = [scorer.score([(query['query'], passage) for passage in query['passages']]) for query in queries]
+
+    return scores, time.perf_counter() - start_time
+
+def kendall_tau(scores: List[float], other_scores: List[float]) -> float:
+
+    concordant = 0
+    discordant = 0
+
+    for i in range(len(scores)):
+        for j in range(i + 1, len(scores)):
+            agreement = (scores[i] - scores[j]) * (other_scores[i] - other_scores[j])
+
+            if agreement > 0:
+                concordant += 1
+            elif agreement < 0:
+                discordant += 1
+
+    pairs = len(scores) * (len(scores) - 1) / 2
+
+    return (concordant - discordant) / pairs if pairs else 1.0
+
+def top_k(scores: List[float], k: int) -> List[int]:
+    return sorted(range(len(scores)), key=lambda index: scores[index], reverse=True)[:k]
+
+def compare_rankings(scores: List[List[float]], other_scores: List[List[float]], k: int) -> Dict:
+
+    compared = [(query_scores, other_query_scores) for query_scores, other_query_scores in zip(scores, other_scores) if query_scores]
+
+    if not compared:
+        return {}
+
+    return {
+        'kendall_tau': sum(kendall_tau(a, b) for a, b in compared) / len(compared),
+        'top_1_agreement': sum(top_k(a, 1) == top_k(b, 1) for a, b in compared) / len(compared),
+        'top_{}_overlap'.format(k): sum(len(set(top_k(a, k)) & set(top_k(b, k))) / min(k, len(a)) for a, b in compared) / len(compared),
+        'max_score_difference': max(abs(x - y) for a, b in compared for x, y in zip(a, b))
+    }
+
+if __name__ == '__main__':
+
+    args = parser.parse_args()
+
+    queries = read_queries(args.input)
+    report = {'queries': len(queries), 'passages': sum(len(query['passages']) for query in queries), 'quantize': args.quantize, 'models': {}}
+
+    for model_name in args.models.split(','):
+        scorer_class, reranker_class = scorer_classes[model_name]
+
+        pytorch_scorer = scorer_class(reranker_class(), batch_size=args.batch_size, max_length=args.max_length)
+        pytorch_scores, pytorch_seconds = score_queries(pytorch_scorer, queries)
+
+        # the ONNX scorer releases the PyTorch head, so the PyTorch scores are taken first
+        onnx_scorer = OnnxScorer(pytorch_scorer, args.onnx_directory, args.quantize, args.intra_op_threads, args.inter_op_threads)
+        onnx_scores, onnx_seconds = score_queries(onnx_scorer, queries)
+
+        model_report = compare_rankings(pytorch_scores, onnx_scores, args.top_k)
+        model_report['pytorch_seconds'] = pytorch_seconds
+        model_report['onnx_seconds'] = onnx_seconds
+        model_report['speedup'] = pytorch_seconds / onnx_seconds if onnx_seconds else None
+
+        report['models'][model_name] = model_report
+
+    print(json.dumps(report, indent=2))
+
+    if args.report_path:
+        with open(args.report_path, 'w') as report_file:
+            json.dump(report, report_file, indent=2)
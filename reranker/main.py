@@ -4,6 +4,7 @@ sys.path.insert(0, '/shared')
 sys.path.insert(0, '/shared/compiled_protobufs')
 
 import grpc
+import os
 from concurrent import futures
 
 from rerankers import PygaggleReranker as RerankerServicer
@@ -11,7 +12,23 @@ from reranker_pb2_grpc import add_RerankerServicer_to_server
 
 def serve():
     server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-    add_RerankerServicer_to_server(RerankerServicer(), server)
+    options = {
+        'batch_size': int(os.environ.get("RERANKER_BATCH_SIZE", 8)),
+        'max_length': int(os.environ.get("RERANKER_MAX_LENGTH", 512)),
+        'score_cache_entries': int(os.environ.get("RERANKER_SCORE_CACHE_ENTRIES", 500000)),
+        'score_cache_path': os.environ.get("RERANKER_SCORE_CACHE_PATH", "/shared/reranker_scores.sqlite")
+            if os.environ.get("RERANKER_SCORE_CACHE_DISK", "false").lower() == "true" else None,
+        'score_cache_disk_entries': int(os.environ.get("RERANKER_SCORE_CACHE_DISK_ENTRIES", 5000000)),
+        'scheduler_max_pairs': int(os.environ.get("RERANKER_SCHEDULER_MAX_PAIRS", 256)),
+        'scheduler_max_wait_seconds': float(os.environ.get("RERANKER_SCHEDULER_MAX_WAIT_MS", 10)) / 1000,
+        'backend': os.environ.get("RERANKER_BACKEND", "pytorch"),
+        'onnx_directory': os.environ.get("RERANKER_ONNX_DIRECTORY", "/shared/onnx_models"),
+        'quantize': os.environ.get("RERANKER_QUANTIZE", "false").lower() == "true",
+        'intra_op_threads': int(os.environ.get("RERANKER_INTRA_OP_THREADS", 0)),
+        'inter_op_threads': int(os.environ.get("RERANKER_INTER_OP_THREADS", 0))
+    }
+
+    add_RerankerServicer_to_server(RerankerServicer(**options), server)
 
     server.add_insecure_port("[::]:8000")
     server.start()
@@ -0,0 +1,94 @@
+from .passage_scorer import PassageScorer
+from concurrent.futures import Future
+from typing import List, Optional, Tuple
+
+import queue
+import threading
+import time
+
+class BatchScheduler:
+
+    """
+    Runs all inference of a model on a single worker thread, shared by every
+    request. Pairs submitted by concurrent requests are collected into one
+    micro-batch until it holds max_batch_pairs pairs or max_wait_seconds have
+    passed since its first request arrived. The batch is then scored at once,
+    and each request gets back the scores of its own pairs. A request cancelled
+    while it waits in the queue is left out of the batch.
+    """
+
+    def __init__(self, scorer: PassageScorer, max_batch_pairs: int = 256, max_wait_seconds: float = 0.01) -> None:
+        self.scorer = scorer
+        self.max_batch_pairs = max_batch_pairs
+        self.max_wait_seconds = max_wait_seconds
+
+        self.requests = queue.Queue()
+
+        self.worker = threading.Thread(target=self.__run, daemon=True)
+        self.worker.start()
+
+    def submit(self, pairs: List[Tuple[str, str]]) -> Future:
+
+        """
+        Queues the pairs to be scored in a batch shared with any concurrent requests, returns the future of their scores
+        """
+
+        scores = Future()
+
+        if pairs:
+            self.requests.put((pairs, scores))
+        else:
+            scores.set_result([])
+
+        return scores
+
+    def score(self, pairs: List[Tuple[str, str]], timeout: Optional[float] = None) -> List[float]:
+
+        """
+        Blocks until the pairs have been scored, raises concurrent.futures.TimeoutError after timeout seconds
+        """
+
+        return self.submit(pairs).result(timeout=timeout)
+
+    def __run(self) -> None:
+
+        while True:
+            request = self.requests.get()
+
+            if not request[1].set_running_or_notify_cancel():
+                continue
+
+            batch = [request]
+            batch_pairs = len(request[0])
+            deadline = time.monotonic() + self.max_wait_seconds
+
+            while batch_pairs < self.max_batch_pairs:
+                remaining_seconds = deadline - time.monotonic()
+
+                if remaining_seconds <= 0:
+                    break
+
+                try:
+                    request = self.requests.get(timeout=remaining_seconds)
+                except queue.Empty:
+                    break
+
+                if request[1].set_running_or_notify_cancel():
+                    batch.append(request)
+                    batch_pairs += len(request[0])
+
+            self.__score_batch(batch)
+
+    def __score_batch(self, batch: List[Tuple[List[Tuple[str, str]], Future]]) -> None:
+
+        try:
+            scores = self.scorer.score([pair for pairs, _ in batch for pair in pairs])
+        except Exception as exception:
+            for _, request_scores in batch:
+                request_scores.set_exception(exception)
+            return
+
+        start = 0
+        for pairs, request_scores in batch:
+            request_scores.set_result(scores[start:start + len(pairs)])
+            start += len(pairs)
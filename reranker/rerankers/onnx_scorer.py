@@ -0,0 +1,90 @@
+from .passage_scorer import PassageScorer
+from typing import Dict
+
+import onnxruntime
+import os
+import torch
+
+class OnnxScorer(PassageScorer):
+
+    """
+    Runs the scoring head of a PyTorch passage scorer with ONNX Runtime on the
+    CPU. The head is exported to {directory}/{model name}.onnx the first time,
+    and optionally quantised to int8 weights with dynamic quantisation, saved
+    next to it as .int8.onnx. Tokenizing, truncation and length bucketing are
+    left to the wrapped scorer. The PyTorch head is released once the session
+    is created.
+    """
+
+    def __init__(self, scorer: PassageScorer, directory: str, quantize: bool = False,
+                 intra_op_threads: int = 0, inter_op_threads: int = 0) -> None:
+
+        super().__init__(None, scorer.tokenizer, 'cpu', scorer.batch_size, scorer.max_length)
+
+        self.scorer = scorer
+        self.input_names = scorer.input_names
+
+        model_path = os.path.join(directory, scorer.head.model.config.name_or_path.replace('/', '--') + '.onnx')
+
+        if not os.path.isfile(model_path):
+            os.makedirs(directory, exist_ok=True)
+            export_head(scorer, model_path)
+
+        if quantize:
+            quantized_model_path = model_path[:-len('.onnx')] + '.int8.onnx'
+
+            if not os.path.isfile(quantized_model_path):
+                quantize_head(model_path, quantized_model_path)
+
+            model_path = quantized_model_path
+
+        session_options = onnxruntime.SessionOptions()
+        session_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # 0 leaves the thread count to ONNX Runtime
+        session_options.intra_op_num_threads = intra_op_threads
+        session_options.inter_op_num_threads = inter_op_threads
+
+        self.session = onnxruntime.InferenceSession(model_path, session_options, providers=['CPUExecutionProvider'])
+
+        scorer.head = None
+
+    def encode(self, query: str, passage: str) -> Dict:
+        return self.scorer.encode(query, passage)
+
+    def predict(self, batch: Dict[str, torch.Tensor]):
+        return self.session.run(None, {name: tensor.cpu().numpy() for name, tensor in batch.items()})[0]
+
+
+def export_head(scorer: PassageScorer, model_path: str) -> None:
+
+    """
+    Exports the scoring head of a scorer to ONNX, with dynamic batch and sequence dimensions
+    """
+
+    example_batch = scorer.tokenizer.pad([scorer.encode("query", "passage")], return_tensors='pt')
+    example_inputs = tuple(example_batch[name].to(scorer.device) for name in scorer.input_names)
+
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in scorer.input_names}
+    dynamic_axes['scores'] = {0: 'batch'}
+
+    temporary_path = model_path + '.tmp'
+
+    with torch.no_grad():
+        torch.onnx.export(scorer.head, example_inputs, temporary_path, input_names=scorer.input_names,
+                          output_names=['scores'], dynamic_axes=dynamic_axes, opset_version=13)
+
+    os.replace(temporary_path, model_path)
+
+
+def quantize_head(model_path: str, quantized_model_path: str) -> None:
+
+    """
+    Quantises the weights of an exported head to int8, activations are quantised at run time
+    """
+
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    temporary_path = quantized_model_path + '.tmp'
+    quantize_dynamic(model_path, temporary_path, weight_type=QuantType.QInt8)
+
+    os.replace(temporary_path, quantized_model_path)
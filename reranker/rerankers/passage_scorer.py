@@ -0,0 +1,140 @@
+from abc import ABC, abstractmethod
+from typing import Dict, List, Tuple
+
+import torch
+
+class PassageScorer(ABC):
+
+    """
+    Scores (query, passage) pairs with a cross-encoder in batches of a fixed size.
+    Passages are cut to a token budget, then the pairs are sorted by length so
+    each batch holds pairs of similar length and is padded only to its longest
+    pair rather than to the longest pair of the whole request. Scores are
+    returned in the order of the pairs.
+
+    The model is wrapped in a head module taking the tokenized batch, named
+    input_names, and returning one score per pair.
+    """
+
+    input_names = ['input_ids', 'attention_mask']
+
+    def __init__(self, head: torch.nn.Module, tokenizer, device, batch_size: int = 8, max_length: int = 512) -> None:
+        self.head = head
+        self.tokenizer = tokenizer
+        self.device = device
+        self.batch_size = batch_size
+        self.max_length = max_length
+
+    def score(self, pairs: List[Tuple[str, str]]) -> List[float]:
+
+        # a word is at least one token, so longer passages can be cut before tokenizing
+        encodings = [self.encode(query, ' '.join(passage.split()[:self.max_length])) for query, passage in pairs]
+
+        scores = [0.0] * len(encodings)
+        order = sorted(range(len(encodings)), key=lambda index: len(encodings[index]['input_ids']))
+
+        for start in range(0, len(order), self.batch_size):
+            batch_indexes = order[start:start + self.batch_size]
+            batch = self.tokenizer.pad([encodings[index] for index in batch_indexes], return_tensors='pt')
+
+            with torch.no_grad():
+                batch_scores = self.predict({name: batch[name].to(self.device) for name in self.input_names})
+
+            for index, score in zip(batch_indexes, batch_scores.tolist()):
+                scores[index] = score
+
+        return scores
+
+    @abstractmethod
+    def encode(self, query: str, passage: str) -> Dict[str, List[int]]:
+
+        """
+        Tokenizes a pair, without padding, into at most max_length tokens
+        """
+
+        pass
+
+    def predict(self, batch: Dict[str, torch.Tensor]):
+
+        """
+        Returns the relevance score of each pair of a padded batch
+        """
+
+        return self.head(**batch)
+
+
+class MonoT5Head(torch.nn.Module):
+
+    """
+    monoT5 up to its relevance score: the log probability of "true" as the first decoded token
+    """
+
+    def __init__(self, model, token_false_id: int, token_true_id: int) -> None:
+        super().__init__()
+        self.model = model
+        self.token_ids = [token_false_id, token_true_id]
+
+    def forward(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        decoder_input_ids = torch.full_like(input_ids[:, :1], self.model.config.decoder_start_token_id)
+
+        logits = self.model(input_ids=input_ids, attention_mask=attention_mask, decoder_input_ids=decoder_input_ids,
+                            use_cache=False)[0][:, -1, :]
+
+        return torch.nn.functional.log_softmax(logits[:, self.token_ids], dim=1)[:, 1]
+
+
+class MonoBERTHead(torch.nn.Module):
+
+    """
+    monoBERT up to its relevance score: the log probability of the relevant class
+    """
+
+    def __init__(self, model) -> None:
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids: torch.Tensor, attention_mask: torch.Tensor, token_type_ids: torch.Tensor) -> torch.Tensor:
+        logits = self.model(input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids)[0]
+
+        if logits.size(1) > 1:
+            return torch.nn.functional.log_softmax(logits, dim=1)[:, -1]
+
+        return logits[:, 0]
+
+
+class MonoT5Scorer(PassageScorer):
+
+    """
+    Scores pairs with monoT5, prompted with "Query: {query} Document: {passage} Relevant:"
+    """
+
+    def __init__(self, reranker, **options) -> None:
+        head = MonoT5Head(reranker.model, reranker.token_false_id, reranker.token_true_id)
+        super().__init__(head, reranker.tokenizer.tokenizer, reranker.device, **options)
+
+    def encode(self, query: str, passage: str) -> Dict[str, List[int]]:
+        prefix_ids = self.tokenizer.encode("Query: {} Document:".format(query), add_special_tokens=False)
+        # the suffix keeps the end of sequence token
+        suffix_ids = self.tokenizer.encode("Relevant:")
+        passage_ids = self.tokenizer.encode(passage, add_special_tokens=False)
+
+        # the passage gives way to the prompt, so a long passage never cuts off "Relevant:"
+        passage_budget = max(self.max_length - len(prefix_ids) - len(suffix_ids), 0)
+        input_ids = (prefix_ids + passage_ids[:passage_budget] + suffix_ids)[-self.max_length:]
+
+        return {'input_ids': input_ids, 'attention_mask': [1] * len(input_ids)}
+
+
+class MonoBERTScorer(PassageScorer):
+
+    """
+    Scores pairs with monoBERT, as "[CLS] query [SEP] passage [SEP]"
+    """
+
+    input_names = ['input_ids', 'attention_mask', 'token_type_ids']
+
+    def __init__(self, reranker, **options) -> None:
+        super().__init__(MonoBERTHead(reranker.model), reranker.tokenizer, reranker.device, **options)
+
+    def encode(self, query: str, passage: str) -> Dict[str, List[int]]:
+        return dict(self.tokenizer(query, passage, truncation='only_second', max_length=self.max_length))
@@ -1,27 +1,90 @@
 from .abstract_reranker import AbstractReranker
-from .pygaggle import MonoT5, MonoBERT, Query, Text
+from .batch_scheduler import BatchScheduler
+from .passage_scorer import MonoT5Scorer, MonoBERTScorer
+from .pygaggle import MonoT5, MonoBERT, Text
+from .score_cache import ScoreCache
+from typing import Dict, List, Optional, Tuple
 from search_result_pb2 import SearchResult, Document, Passage
 from reranker_pb2 import RerankRequest
 
+import concurrent.futures
+import threading
+import time
+import torch
+
+def measure_seconds_per_passage(scorer, batch_size: int) -> float:
+
+    """
+    Times a batch of passages as long as the offline pipeline makes them, after a first batch warms the model up
+    """
+
+    pairs = [("how long does reranking a passage take", " ".join(["passage"] * 250))] * batch_size
+    scorer.score(pairs)
+
+    start_time = time.monotonic()
+    scorer.score(pairs)
+
+    return (time.monotonic() - start_time) / len(pairs)
+
 class PygaggleReranker(AbstractReranker):
 
-    def __init__(self):
+    def __init__(self, batch_size: int = 8, max_length: int = 512, score_cache_entries: int = 500000, score_cache_path: str = None,
+                 score_cache_disk_entries: int = 5000000,
+                 scheduler_max_pairs: int = 256, scheduler_max_wait_seconds: float = 0.01,
+                 backend: str = 'pytorch', onnx_directory: str = '/shared/onnx_models', quantize: bool = False,
+                 intra_op_threads: int = 0, inter_op_threads: int = 0):
+
+        scorer_options = {'batch_size': batch_size, 'max_length': max_length}
+
+        scorers = {
+            'T5' : MonoT5Scorer(MonoT5(), **scorer_options),
+            'BERT' : MonoBERTScorer(MonoBERT(), **scorer_options)
+        }
 
-        self.rerankers = {
-            'T5' : MonoT5(),
-            'BERT' : MonoBERT()
+        if backend == 'onnx':
+            # onnxruntime is only needed by this backend
+            from .onnx_scorer import OnnxScorer
+
+            scorers = {
+                name: OnnxScorer(scorer, onnx_directory, quantize, intra_op_threads, inter_op_threads)
+                for name, scorer in scorers.items()
+            }
+        elif backend == 'pytorch':
+            if intra_op_threads:
+                torch.set_num_threads(intra_op_threads)
+            if inter_op_threads:
+                torch.set_num_interop_threads(inter_op_threads)
+        else:
+            raise ValueError("Unknown reranker backend: {}".format(backend))
+
+        backend_name = backend + ('-int8' if backend == 'onnx' and quantize else '')
+
+        # time to score a passage with each model, measured before serving and then updated from every passage
+        # the model scores, to tell if a cascade stage can score more passages within its latency budget
+        self.seconds_per_passage = {name: measure_seconds_per_passage(scorer, batch_size) for name, scorer in scorers.items()}
+        self.estimate_lock = threading.Lock()
+
+        # one inference thread per model, batching the passages of concurrent requests together
+        self.schedulers = {
+            name: BatchScheduler(scorer, scheduler_max_pairs, scheduler_max_wait_seconds)
+            for name, scorer in scorers.items()
         }
 
-        self.chosen_reranker = None
+        # passages are truncated before scoring and backends round differently, so both are part of a score's key
+        self.model_keys = {name: '{}:{}:{}'.format(name, max_length, backend_name) for name in scorers}
+
+        self.score_cache = ScoreCache(score_cache_entries, score_cache_path, score_cache_disk_entries)
+
+        # a cascade stage scores its documents about a forward batch at a time, checking its latency budget in between
+        self.cascade_chunk_pairs = batch_size
 
     def rerank(self, rerank_request: RerankRequest, context):
 
-        if rerank_request.reranker == 0:
-            self.chosen_reranker = self.rerankers['T5']
-        
-        if rerank_request.reranker == 1:
-            self.chosen_reranker = self.rerankers['BERT']
-        
+        if rerank_request.reranker == RerankRequest.CASCADE:
+            return self.__cascade_rerank(rerank_request)
+
+        reranker_name = RerankRequest.Reranker.Name(rerank_request.reranker)
+
         first_pass_search_result: SearchResult = rerank_request.search_result
 
         num_passages_to_rerank = rerank_request.num_passages
@@ -32,11 +95,11 @@ class PygaggleReranker(AbstractReranker):
             first_pass_search_result, num_passages_to_rerank
         )
 
-        texts = [ Text(passage[1], {'id': passage[0]}, 0) for passage in parsed_passages]
+        scores = self.__score(reranker_name, rerank_request.search_query, [passage[1] for passage in parsed_passages])
 
-        query = Query(rerank_request.search_query)
+        texts = [ Text(passage[1], {'id': passage[0]}, score) for passage, score in zip(parsed_passages, scores)]
 
-        reranked_passages = self.chosen_reranker.rerank(query, texts)
+        reranked_passages = sorted(texts, key=lambda text: text.score, reverse=True)
 
         reordered_documents = self.__collect_passages(reranked_passages, lookup_dictionary)
 
@@ -57,8 +120,190 @@ class PygaggleReranker(AbstractReranker):
             
             search_result.documents.append(proto_document)
 
+        search_result.reranked_documents = len(search_result.documents)
+        search_result.rerank_complete = True
+
+        return search_result
+
+    def __cascade_rerank(self, rerank_request: RerankRequest) -> SearchResult:
+
+        """
+        Keeps the best candidate_budget documents by first pass score, reranks them with BERT and then the
+        top cascade_depth of those with T5. A stage stops before a chunk of documents whose uncached passages
+        are not expected to be scored within the latency budget, and gives up on a chunk still being scored
+        when the budget runs out. Documents are ranked by the last stage that scored them, T5 before BERT
+        before unscored, and unscored documents keep their first pass order.
+        """
+
+        deadline = None
+        if rerank_request.latency_budget_ms:
+            deadline = time.monotonic() + rerank_request.latency_budget_ms / 1000
+
+        query = rerank_request.search_query
+        num_passages = rerank_request.num_passages
+        cascade_depth = rerank_request.cascade_depth or 10
+
+        documents = sorted(rerank_request.search_result.documents, key=lambda document: document.score, reverse=True)
+        candidate_count = rerank_request.candidate_budget or len(documents)
+        candidates = documents[:candidate_count]
+
+        bert_scores, bert_complete = self.__score_documents('BERT', query, candidates, num_passages, deadline)
+
+        bert_ranking = self.__rank_documents(candidates, bert_scores)
+        t5_scores, t5_complete = self.__score_documents('T5', query, bert_ranking[:cascade_depth], num_passages, deadline)
+
+        t5_ranking = self.__rank_documents(bert_ranking, t5_scores)
+
+        search_result = SearchResult()
+
+        for document in t5_ranking:
+            search_result.documents.append(self.__scored_document(document, num_passages, t5_scores[document.id]))
+
+        for document in bert_ranking:
+            if document.id not in t5_scores:
+                search_result.documents.append(self.__scored_document(document, num_passages, bert_scores[document.id]))
+
+        for document in documents:
+            if document.id not in bert_scores:
+                search_result.documents.append(self.__scored_document(document, num_passages))
+
+        search_result.reranked_documents = len(bert_scores)
+        search_result.rerank_complete = bert_complete and t5_complete
+
         return search_result
 
+    def __score_documents(self, reranker_name: str, query: str, documents: List[Document], num_passages: int,
+                          deadline: Optional[float]) -> Tuple[Dict[str, List[float]], bool]:
+
+        """
+        Scores the first num_passages passages of documents, in order, a chunk of documents at a time. Returns the
+        scores of each scored document and whether every document was scored before the deadline.
+        """
+
+        model_key = self.model_keys[reranker_name]
+        document_scores = {}
+
+        chunks = [[]]
+        chunk_passages = 0
+        for document in documents:
+            if chunk_passages >= self.cascade_chunk_pairs:
+                chunks.append([])
+                chunk_passages = 0
+
+            chunks[-1].append(document)
+            chunk_passages += len(document.passages[:num_passages])
+
+        for chunk in chunks:
+            passages = [passage.body for document in chunk for passage in document.passages[:num_passages]]
+            cached_scores = self.score_cache.get_many(model_key, query, passages)
+
+            remaining_seconds = None
+
+            if deadline is not None:
+                remaining_seconds = deadline - time.monotonic()
+                uncached_passages = len({passage for passage, score in zip(passages, cached_scores) if score is None})
+
+                with self.estimate_lock:
+                    expected_seconds = uncached_passages * self.seconds_per_passage[reranker_name]
+
+                if remaining_seconds <= 0 or expected_seconds > remaining_seconds:
+                    return document_scores, False
+
+            try:
+                scores = self.__score(reranker_name, query, passages, cached_scores, timeout=remaining_seconds)
+            except concurrent.futures.TimeoutError:
+                return document_scores, False
+
+            start = 0
+            for document in chunk:
+                passage_count = len(document.passages[:num_passages])
+                document_scores[document.id] = scores[start:start + passage_count]
+                start += passage_count
+
+        return document_scores, True
+
+    def __rank_documents(self, documents: List[Document], document_scores: Dict[str, List[float]]) -> List[Document]:
+
+        """
+        Orders the scored documents by their best passage score
+        """
+
+        scored_documents = [document for document in documents if document.id in document_scores]
+
+        return sorted(scored_documents, key=lambda document: max(document_scores[document.id], default=float('-inf')), reverse=True)
+
+    def __scored_document(self, document: Document, num_passages: int, scores: Optional[List[float]] = None) -> Document:
+
+        scored_document = Document()
+        scored_document.id = document.id
+        scored_document.url = document.url
+        scored_document.title = document.title
+        scored_document.score = document.score
+
+        passages = list(document.passages[:num_passages])
+
+        if scores is None:
+            scored_document.passages.extend(passages)
+            return scored_document
+
+        for passage, score in sorted(zip(passages, scores), key=lambda scored_passage: scored_passage[1], reverse=True):
+            scored_passage = scored_document.passages.add()
+            scored_passage.id = passage.id
+            scored_passage.body = passage.body
+            scored_passage.score = score
+
+        return scored_document
+
+
+    def __score(self, reranker_name: str, query: str, passages: List[str], cached_scores: List[Optional[float]] = None,
+                timeout: Optional[float] = None) -> List[float]:
+
+        """
+        Scores passages against a query, sending only the passages without a cached score to the model.
+        Raises concurrent.futures.TimeoutError if they are not scored within timeout seconds. Passages that
+        were already being scored by then are still cached once they are, the others are not scored.
+        """
+
+        model_key = self.model_keys[reranker_name]
+
+        if cached_scores is None:
+            cached_scores = self.score_cache.get_many(model_key, query, passages)
+
+        uncached_passages = list(dict.fromkeys(passage for passage, score in zip(passages, cached_scores) if score is None))
+
+        if not uncached_passages:
+            return cached_scores
+
+        start_time = time.monotonic()
+        future_scores = self.schedulers[reranker_name].submit([(query, passage) for passage in uncached_passages])
+
+        try:
+            new_scores = future_scores.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            def cache_late_scores(late_scores: concurrent.futures.Future) -> None:
+                if late_scores.exception() is None:
+                    self.score_cache.put_many(model_key, query, uncached_passages, late_scores.result())
+
+            if not future_scores.cancel():
+                future_scores.add_done_callback(cache_late_scores)
+
+            raise
+
+        self.__record_scoring_time(reranker_name, time.monotonic() - start_time, len(uncached_passages))
+        self.score_cache.put_many(model_key, query, uncached_passages, new_scores)
+
+        scored_passages = dict(zip(uncached_passages, new_scores))
+
+        return [scored_passages[passage] if score is None else score for passage, score in zip(passages, cached_scores)]
+
+    def __record_scoring_time(self, reranker_name: str, seconds: float, passages: int) -> None:
+
+        """
+        Moves the expected time to score a passage towards a measurement, smoothed over recent requests
+        """
+
+        with self.estimate_lock:
+            self.seconds_per_passage[reranker_name] = 0.7 * self.seconds_per_passage[reranker_name] + 0.3 * seconds / passages
 
     def __create_reranker_input(self, search_result, num_passages_to_rerank):
 
@@ -0,0 +1,162 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import hashlib
+import sqlite3
+import threading
+
+class ScoreCache:
+
+    """
+    Thread-safe cache of passage scores, keyed on the model, the query and a
+    SHA-1 hash of the passage text. Up to max_entries scores are kept in memory
+    and evicted least recently used first. If a path is given, every score is
+    also written to a SQLite database there, which outlives the service and is
+    read when a score is not in memory. The database keeps up to
+    max_disk_entries scores, the oldest written are deleted beyond that.
+    """
+
+    # sqlite limits the number of parameters of a statement
+    LOOKUP_CHUNK_SIZE = 500
+    # share of max_disk_entries kept after trimming, so the database is not trimmed on every write
+    DISK_TRIM_RATIO = 0.9
+
+    def __init__(self, max_entries: int, path: Optional[str] = None, max_disk_entries: int = 5000000) -> None:
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+
+        self.connection = None
+        self.disk_entries = 0
+        if path:
+            self.connection = sqlite3.connect(path, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            # rows are rewritten on replace, so the rowid orders them by when they were written
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS passage_scores (model TEXT, query TEXT, passage_hash TEXT, score REAL, "
+                "UNIQUE (model, query, passage_hash))"
+            )
+            self.connection.commit()
+
+            self.disk_entries = self.connection.execute("SELECT COUNT(*) FROM passage_scores").fetchone()[0]
+
+    def get_many(self, model: str, query: str, passages: List[str]) -> List[Optional[float]]:
+
+        """
+        Returns the cached score of each passage, or None for passages that have not been scored
+        """
+
+        passage_hashes = [self.__hash(passage) for passage in passages]
+        scores = {}
+
+        with self.lock:
+            for passage_hash in passage_hashes:
+                score = self.entries.get((model, query, passage_hash))
+
+                if score is not None:
+                    self.entries.move_to_end((model, query, passage_hash))
+                    scores[passage_hash] = score
+
+            missing_hashes = [passage_hash for passage_hash in dict.fromkeys(passage_hashes) if passage_hash not in scores]
+
+            if missing_hashes and self.connection is not None:
+                disk_scores = self.__read(model, query, missing_hashes)
+
+                for passage_hash, score in disk_scores.items():
+                    self.__store((model, query, passage_hash), score)
+
+                self.disk_hits += len(disk_scores)
+                scores.update(disk_scores)
+
+            cached_scores = [scores.get(passage_hash) for passage_hash in passage_hashes]
+
+            self.misses += cached_scores.count(None)
+            self.hits += len(cached_scores) - cached_scores.count(None)
+
+            return cached_scores
+
+    def put_many(self, model: str, query: str, passages: List[str], scores: List[float]) -> None:
+
+        rows = [(model, query, self.__hash(passage), score) for passage, score in zip(passages, scores)]
+
+        with self.lock:
+            for row in rows:
+                self.__store(row[:3], row[3])
+
+            if self.connection is not None:
+                self.connection.executemany("INSERT OR REPLACE INTO passage_scores VALUES (?, ?, ?, ?)", rows)
+
+                # counts replaced rows too, so the database is recounted before anything is deleted
+                self.disk_entries += len(rows)
+
+                if self.max_disk_entries and self.disk_entries > self.max_disk_entries:
+                    self.__trim_disk()
+
+                self.connection.commit()
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'disk_entries': self.disk_entries,
+                'disk_evictions': self.disk_evictions
+            }
+
+    def __trim_disk(self) -> None:
+
+        """
+        Deletes the oldest written scores once the database holds more than max_disk_entries
+        """
+
+        self.disk_entries = self.connection.execute("SELECT COUNT(*) FROM passage_scores").fetchone()[0]
+
+        if self.disk_entries <= self.max_disk_entries:
+            return
+
+        excess_entries = self.disk_entries - int(self.max_disk_entries * self.DISK_TRIM_RATIO)
+        self.connection.execute(
+            "DELETE FROM passage_scores WHERE rowid IN (SELECT rowid FROM passage_scores ORDER BY rowid LIMIT ?)",
+            (excess_entries,)
+        )
+
+        self.disk_entries -= excess_entries
+        self.disk_evictions += excess_entries
+
+    def __store(self, key, score: float) -> None:
+        self.entries[key] = score
+        self.entries.move_to_end(key)
+
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def __read(self, model: str, query: str, passage_hashes: List[str]) -> Dict[str, float]:
+
+        scores = {}
+
+        for start in range(0, len(passage_hashes), self.LOOKUP_CHUNK_SIZE):
+            chunk = passage_hashes[start:start + self.LOOKUP_CHUNK_SIZE]
+            rows = self.connection.execute(
+                "SELECT passage_hash, score FROM passage_scores WHERE model = ? AND query = ? AND passage_hash IN ({})".format(
+                    ", ".join("?" * len(chunk))
+                ),
+                [model, query] + chunk
+            )
+            scores.update(rows)
+
+        return scores
+
+    def __hash(self, passage: str) -> str:
+        return hashlib.sha1(passage.encode('utf-8')).hexdigest()
@@ -1,3 +1,4 @@
+import os
 import sys
 
 sys.path.insert(0, '/shared')
@@ -10,8 +11,23 @@ from searchers import BackendSelector as SearcherServicer
 from searcher_pb2_grpc import add_SearcherServicer_to_server
 
 def serve():
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-    add_SearcherServicer_to_server(SearcherServicer(), server)
+    workers = int(os.environ.get("SEARCHER_WORKERS", 10))
+
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=workers))
+    searcher_servicer = SearcherServicer(
+        cache_max_bytes=int(os.environ.get("SEARCH_CACHE_MAX_MB", 256)) * 1024 * 1024,
+        cache_ttl_seconds=float(os.environ.get("SEARCH_CACHE_TTL_SECONDS", 3600)),
+        batch_threads=int(os.environ.get("SEARCHER_BATCH_THREADS", os.cpu_count())),
+        max_open_indexes=int(os.environ.get("SEARCHER_MAX_OPEN_INDEXES", 0)) or None,
+        max_index_bytes=int(os.environ.get("SEARCHER_MAX_INDEX_MB", 0)) * 1024 * 1024 or None,
+        max_searchers_per_index=int(os.environ.get("SEARCHER_MAX_SEARCHERS_PER_INDEX", workers)) or None,
+        preload_collections=[collection for collection in os.environ.get("SEARCHER_PRELOAD", "").split(",") if collection],
+        federate_all=os.environ.get("SEARCHER_FEDERATE_ALL", "false").lower() == "true",
+        federation_threads=int(os.environ.get("SEARCHER_FEDERATION_THREADS", 8)),
+        federation_max_depth=int(os.environ.get("SEARCHER_FEDERATION_MAX_DEPTH", 200)),
+        document_cache_max_bytes=int(os.environ.get("DOCUMENT_CACHE_MAX_MB", 128)) * 1024 * 1024
+    )
+    add_SearcherServicer_to_server(searcher_servicer, server)
 
     server.add_insecure_port("[::]:8000")
     server.start()
@@ -10,10 +10,34 @@ class AbstractSearcher(ABC, SearcherServicer):
         """
         pass
 
+    @abstractmethod
+    def search_stream(self, search_query, context):
+        """
+        Query an index and yield the retrieved documents one at a time, in rank order
+        """
+        pass
+
     @abstractmethod
     def get_document(self, document_request, context):
         """
         Given a document id, return a document's attributes
         """
 
-        pass
\ No newline at end of file
+        pass
+
+    @abstractmethod
+    def get_documents(self, documents_request, context):
+        """
+        Given a list of document ids, return the attributes of the documents found, in the same order
+        """
+
+        pass
+
+
+    @abstractmethod
+    def batch_search(self, batch_search_query, context):
+        """
+        Run many queries, each with its own parameters, and return their search results keyed by query id
+        """
+
+        pass
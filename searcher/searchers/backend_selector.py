@@ -1,33 +1,57 @@
 from .abstract_searcher import AbstractSearcher
 from .pyserini_searcher import PyseriniSearcher
+from searcher_pb2 import SearchBackend, BatchSearchQuery, BatchSearchResult
 
 class BackendSelector(AbstractSearcher):
 
-    def __init__(self) -> None:
+    def __init__(self, **searcher_options) -> None:
         self.searchers = {
-            "PYSERINI" : PyseriniSearcher()
+            "PYSERINI" : PyseriniSearcher(**searcher_options)
         }
-
-        self.chosen_backend = None
     
     def search(self, search_query, context):
-        
-        if search_query.search_backend == 0:
-            self.chosen_backend = self.searchers["PYSERINI"]
-        
-        return self.chosen_backend.search(search_query, context)
+        # the backend is chosen per request, requests are served concurrently
+        backend = self.__select_backend(search_query.search_backend)
+
+        return backend.search(search_query, context)
+    
+    def search_stream(self, search_query, context):
+        backend = self.__select_backend(search_query.search_backend)
+
+        return backend.search_stream(search_query, context)
     
     def get_document(self, document_request, context):
         # user might want to look up a doc directly without performing a
         # search first
+        backend = self.__select_backend(document_request.search_backend)
+
+        return backend.get_document(document_request, context)
+
+    def get_documents(self, documents_request, context):
+        backend = self.__select_backend(documents_request.search_backend)
+
+        return backend.get_documents(documents_request, context)
+
+    def batch_search(self, batch_search_query, context):
+        # queries of a batch may ask for different backends, each backend
+        # runs its share of the batch
+        backend_queries = {}
+
+        for search_query in batch_search_query.queries:
+            backend_name = SearchBackend.Name(search_query.search_backend)
+
+            if backend_name not in backend_queries:
+                backend_queries[backend_name] = BatchSearchQuery(threads=batch_search_query.threads)
+
+            backend_queries[backend_name].queries.append(search_query)
+
+        batch_search_result = BatchSearchResult()
+
+        for backend_name, backend_batch_query in backend_queries.items():
+            backend_result = self.searchers[backend_name].batch_search(backend_batch_query, context)
+            batch_search_result.MergeFrom(backend_result)
+
+        return batch_search_result
 
-        if self.chosen_backend:
-            return self.chosen_backend.get_document(document_request, context)
-        
-        else:
-            if document_request.search_backend == 0:
-                self.chosen_backend = self.searchers["PYSERINI"]
-            
-            return self.chosen_backend.get_document(document_request, context)
-        
-        
\ No newline at end of file
+    def __select_backend(self, search_backend):
+        return self.searchers[SearchBackend.Name(search_backend)]
@@ -0,0 +1,99 @@
+from search_result_pb2 import Document, Passage
+from typing import Optional
+
+import json
+import mmap
+import os
+import struct
+
+class Docstore:
+
+    """
+    Read-only document store of a collection, written by the offline pipeline.
+    {collection}.data holds one JSON document with its passages per line and
+    {collection}.index a header, the sorted, NUL padded, fixed-width document ids
+    and then the (offset, length) of each document in the data file. Both are
+    memory mapped, so a lookup is a binary search over the ids and a slice of
+    the data file, served from the page cache.
+    """
+
+    MAGIC = b'DOCSTR01'
+    # magic, key width, key count
+    HEADER = struct.Struct('<8sIQ')
+    # byte offset and length of a document in the data file
+    LOCATION = struct.Struct('<QI')
+
+    def __init__(self, directory: str, collection_name: str) -> None:
+
+        with open(os.path.join(directory, collection_name + '.index'), 'rb') as index_file:
+            self.index = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        with open(os.path.join(directory, collection_name + '.data'), 'rb') as data_file:
+            self.data = mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.key_width, self.key_count = self.HEADER.unpack_from(self.index, 0)
+
+        if magic != self.MAGIC:
+            raise ValueError("{} is not a document store index".format(collection_name))
+
+        self.keys_offset = self.HEADER.size
+        self.locations_offset = self.keys_offset + self.key_width * self.key_count
+
+    @classmethod
+    def open(cls, directory: str, collection_name: str) -> Optional['Docstore']:
+
+        """
+        Opens the document store of a collection, or returns None if it has not been built
+        """
+
+        if not os.path.isfile(os.path.join(directory, collection_name + '.index')):
+            return None
+
+        return cls(directory, collection_name)
+
+    def get(self, document_id: str) -> Optional[Document]:
+
+        location = self.__find(document_id)
+
+        if location is None:
+            return None
+
+        offset, length = location
+        stored_document = json.loads(self.data[offset:offset + length])
+
+        retrieved_document = Document()
+        retrieved_document.id = stored_document["id"]
+        retrieved_document.url = stored_document["url"]
+        retrieved_document.title = stored_document["title"]
+
+        for passage in stored_document["passages"]:
+            chunked_passage = Passage()
+            chunked_passage.id = passage["id"]
+            chunked_passage.body = passage["body"]
+
+            retrieved_document.passages.append(chunked_passage)
+
+        return retrieved_document
+
+    def __find(self, document_id: str):
+
+        key = document_id.encode('utf-8')
+        if len(key) > self.key_width:
+            return None
+
+        key = key.ljust(self.key_width, b'\0')
+
+        low, high = 0, self.key_count
+        while low < high:
+            middle = (low + high) // 2
+            key_offset = self.keys_offset + middle * self.key_width
+            middle_key = self.index[key_offset:key_offset + self.key_width]
+
+            if middle_key < key:
+                low = middle + 1
+            elif middle_key > key:
+                high = middle
+            else:
+                return self.LOCATION.unpack_from(self.index, self.locations_offset + middle * self.LOCATION.size)
+
+        return None
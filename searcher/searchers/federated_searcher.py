@@ -0,0 +1,108 @@
+from .searcher_pool import SearcherPool
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+import math
+
+class FederatedSearcher:
+
+    """
+    Searches several collection indexes at once and merges their results. Each
+    index is searched on its own thread and its top hits are rescored with BM25
+    using statistics summed over all of the searched indexes: document
+    frequencies, document count and average document length. The merged ranking
+    then closely matches searching a single index holding every collection.
+
+    Rescoring reads the term frequencies and length of each hit from its stored
+    document vector, one lookup per hit on the request path. Each index is
+    therefore searched only num_hits * depth_factor deep, and no deeper than
+    max_depth unless more hits were asked for. The index readers are lent by
+    the searcher pool, within its budget of open indexes.
+    """
+
+    def __init__(self, searcher_pool: SearcherPool, threads: int = 8, depth_factor: int = 2, max_depth: int = 200) -> None:
+        self.searcher_pool = searcher_pool
+        # each index is searched deeper than the number of hits asked for, as
+        # its local ranking may differ from the global one
+        self.depth_factor = depth_factor
+        self.max_depth = max_depth
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+
+        # document and term counts of each index, which do not change while it is served
+        self.index_statistics = {}
+
+    def search(self, collections: List[str], query: str, num_hits: int, k1: float, b: float) -> List[Tuple]:
+
+        """
+        Returns the top num_hits over all collections as (hit, score) pairs, best first
+        """
+
+        with self.searcher_pool.acquire_reader(collections[0]) as index_reader:
+            query_terms = Counter(index_reader.analyze(query))
+
+        term_document_frequencies = Counter()
+        documents = 0
+        total_terms = 0
+
+        for collection in collections:
+            with self.searcher_pool.acquire_reader(collection) as index_reader:
+                collection_documents, collection_terms = self.__index_statistics(collection, index_reader)
+
+                for term in query_terms:
+                    document_frequency, _ = index_reader.get_term_counts(term, analyzer=None)
+                    term_document_frequencies[term] += document_frequency
+
+            documents += collection_documents
+            total_terms += collection_terms
+
+        # Lucene's BM25 idf
+        term_weights = {
+            term: query_term_count * math.log(1 + (documents - term_document_frequencies[term] + 0.5) / (term_document_frequencies[term] + 0.5))
+            for term, query_term_count in query_terms.items()
+        }
+        average_document_length = total_terms / documents if documents else 0
+
+        searches = [
+            self.executor.submit(self.__search_collection, collection, query, num_hits, k1, b, term_weights, average_document_length)
+            for collection in collections
+        ]
+
+        scored_hits = [scored_hit for search in searches for scored_hit in search.result()]
+        scored_hits.sort(key=lambda scored_hit: scored_hit[1], reverse=True)
+
+        return scored_hits[:num_hits]
+
+    def __search_collection(self, collection: str, query: str, num_hits: int, k1: float, b: float,
+                            term_weights: Dict[str, float], average_document_length: float) -> List[Tuple]:
+
+        depth = max(num_hits, min(num_hits * self.depth_factor, self.max_depth))
+
+        with self.searcher_pool.acquire(collection, k1, b) as searcher:
+            hits = searcher.search(query, depth)
+
+        scored_hits = []
+
+        with self.searcher_pool.acquire_reader(collection) as index_reader:
+            for hit in hits:
+                document_vector = index_reader.get_document_vector(hit.docid) or {}
+                document_length = sum(document_vector.values())
+                length_normalisation = k1 * (1 - b + b * document_length / average_document_length) if average_document_length else k1
+
+                score = 0.0
+                for term, term_weight in term_weights.items():
+                    term_frequency = document_vector.get(term, 0)
+                    if term_frequency:
+                        score += term_weight * term_frequency / (term_frequency + length_normalisation)
+
+                scored_hits.append((hit, score))
+
+        return scored_hits
+
+    def __index_statistics(self, collection: str, index_reader) -> Tuple[int, int]:
+
+        if collection not in self.index_statistics:
+            statistics = index_reader.stats()
+            self.index_statistics[collection] = (statistics['documents'], statistics['total_terms'])
+
+        return self.index_statistics[collection]
@@ -0,0 +1,84 @@
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable
+
+import threading
+import time
+
+class LRUCache:
+
+    """
+    Thread-safe cache bounded by the total size of its values, in bytes. Entries
+    are evicted least recently used first once the size cap is reached, and are
+    dropped when read after more than ttl_seconds since they were stored.
+    """
+
+    def __init__(self, max_bytes: int, ttl_seconds: float, size_of: Callable = len) -> None:
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.size_of = size_of
+
+        self.entries = OrderedDict()
+        self.current_bytes = 0
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default=None):
+
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if entry is None:
+                self.misses += 1
+                return default
+
+            value, size, stored_at = entry
+
+            if time.monotonic() - stored_at > self.ttl_seconds:
+                self.__remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+
+            return value
+
+    def put(self, key: Hashable, value) -> None:
+
+        size = self.size_of(value)
+
+        # a value larger than the whole cache would only evict everything else
+        if size > self.max_bytes:
+            return
+
+        with self.lock:
+            if key in self.entries:
+                self.__remove(key)
+
+            self.entries[key] = (value, size, time.monotonic())
+            self.current_bytes += size
+
+            while self.current_bytes > self.max_bytes:
+                oldest_key = next(iter(self.entries))
+                self.__remove(oldest_key)
+                self.evictions += 1
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.current_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+    def __remove(self, key: Hashable) -> None:
+        _, size, _ = self.entries.pop(key)
+        self.current_bytes -= size
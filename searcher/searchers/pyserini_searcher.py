@@ -1,69 +1,444 @@
 from .abstract_searcher import AbstractSearcher
-from pyserini.search import SimpleSearcher
-from searcher_pb2 import SearchQuery, DocumentQuery
+from .lru_cache import LRUCache
+from .docstore import Docstore
+from .federated_searcher import FederatedSearcher
+from .searcher_pool import SearcherPool, index_exists
+from searcher_pb2 import SearchQuery, DocumentQuery, DocumentsQuery, Documents, SearchParameters, BatchSearchQuery, BatchSearchResult, Projection
 from search_result_pb2 import SearchResult, Document, Passage
 
 from bs4 import BeautifulSoup as bs
+from collections import defaultdict
+from typing import List, Tuple
 import lxml
+import json
+import os
+
+def normalise_query(query: str) -> str:
+    #the analyzer lowercases and splits on whitespace, so these queries match the same documents
+    return ' '.join(query.lower().split())
+
+def projection_key(projection: Projection) -> Tuple:
+    return (projection.max_passages, projection.exclude_bodies, projection.ids_only)
+
+def copy_projected_document(document: Document, projected_document: Document, projection: Projection) -> None:
+
+    """
+    Copies the parts of a document the projection asks for into another document
+    """
+
+    if not (projection.max_passages or projection.exclude_bodies or projection.ids_only):
+        projected_document.CopyFrom(document)
+        return
+
+    projected_document.id = document.id
+    projected_document.score = document.score
+
+    if projection.ids_only:
+        return
+
+    projected_document.url = document.url
+    projected_document.title = document.title
+
+    passages = document.passages[:projection.max_passages] if projection.max_passages else document.passages
+
+    for passage in passages:
+        projected_passage = projected_document.passages.add()
+        projected_passage.id = passage.id
+        projected_passage.score = passage.score
+
+        if not projection.exclude_bodies:
+            projected_passage.body = passage.body
 
 class PyseriniSearcher(AbstractSearcher):
 
-    def __init__(self):
+    def __init__(self, cache_max_bytes: int = 256 * 1024 * 1024, cache_ttl_seconds: float = 3600, batch_threads: int = os.cpu_count(),
+            max_open_indexes: int = None, max_index_bytes: int = None, max_searchers_per_index: int = None, preload_collections: List[str] = (),
+            federate_all: bool = False, federation_threads: int = 8, federation_max_depth: int = 200, document_cache_max_bytes: int = 128 * 1024 * 1024,
+            docstore_directory: str = '../../shared/docstores', passage_depth: int = 10):
 
-        self.indexes = {
-            'ALL' : SimpleSearcher('../../shared/indexes/all'),
-            'KILT' : SimpleSearcher('../../shared/indexes/kilt'),
-            'MARCO' : SimpleSearcher('../../shared/indexes/marco'),
-            'WAPO' : SimpleSearcher('../../shared/indexes/wapo')
+        self.searcher_pool = SearcherPool({
+            'ALL' : '../../shared/indexes/all',
+            'KILT' : '../../shared/indexes/kilt',
+            'MARCO' : '../../shared/indexes/marco',
+            'WAPO' : '../../shared/indexes/wapo',
+            #passage-level indexes, one document per passage
+            'KILT_PASSAGES' : '../../shared/indexes/kilt_passages',
+            'MARCO_PASSAGES' : '../../shared/indexes/marco_passages',
+            'WAPO_PASSAGES' : '../../shared/indexes/wapo_passages'
             #new indices go here
-        }
+        }, max_open_indexes=max_open_indexes, max_index_bytes=max_index_bytes, max_searchers_per_index=max_searchers_per_index)
+
+        #indexes are otherwise opened on their first request
+        self.searcher_pool.preload(preload_collections)
+
+        #results are cached with the number of hits asked for, see search
+        self.result_cache = LRUCache(cache_max_bytes, cache_ttl_seconds, size_of=lambda entry: entry[1].ByteSize())
+
+        #parsed documents, shared by document lookups and search hits, without their scores
+        self.document_cache = LRUCache(document_cache_max_bytes, cache_ttl_seconds, size_of=lambda document: document.ByteSize())
+
+        self.batch_threads = batch_threads
 
-        self.chosen_searcher = None
+        #a passage search retrieves this many passages per document asked for, to group into documents
+        self.passage_depth = passage_depth
+
+        #ALL is searched as the union of the other collections when asked to, or when there is no ALL index
+        self.federated_searcher = FederatedSearcher(self.searcher_pool, threads=federation_threads, max_depth=federation_max_depth)
+        self.federated_collections = ('KILT', 'MARCO', 'WAPO')
+        #checked once, an ALL index built later is picked up on restart
+        self.federate_all = federate_all or not index_exists(self.searcher_pool.index_paths['ALL'])
+
+        #documents are served from the document store of their collection when it has been built
+        self.docstores = {}
+
+        for collection in self.federated_collections:
+            docstore = Docstore.open(docstore_directory, collection.lower())
+
+            if docstore:
+                self.docstores[collection] = docstore
     
     def search(self, search_query: SearchQuery, context):
 
-
+        #all state is local to the request, as requests are served concurrently
         query: str = search_query.query
         num_hits: int = search_query.num_hits
 
-        if search_query.search_parameters.collection == 0:
-            self.chosen_searcher = self.indexes['ALL']
-        
-        if search_query.search_parameters.collection == 1:
-            self.chosen_searcher = self.indexes['KILT']
-        
-        if search_query.search_parameters.collection == 2:
-            self.chosen_searcher = self.indexes['MARCO']
-        
-        if search_query.search_parameters.collection == 3:
-            self.chosen_searcher = self.indexes['WAPO']
-        
-        bm25_b = search_query.search_parameters.parameters["b"]
-        bm25_k1 = search_query.search_parameters.parameters["k1"]
+        projection: Projection = search_query.projection
+
+        collections, bm25_k1, bm25_b, search_mode = self.__search_settings(search_query)
         
-        self.chosen_searcher.set_bm25(float(bm25_k1), float(bm25_b))
-        hits = self.chosen_searcher.search(query, num_hits)
+        cache_key = (normalise_query(query), collections, bm25_k1, bm25_b, projection_key(projection), search_mode)
+        search_result = self.__cached_search_result(cache_key, num_hits)
+
+        if search_result is not None:
+            return search_result
+
+        if search_mode == SearchQuery.PASSAGE:
+            search_result = self.__passage_search(collections, query, num_hits, bm25_k1, bm25_b, projection)
+        else:
+            search_result = self.__convert_hits(self.__retrieve(collections, query, num_hits, bm25_k1, bm25_b), projection)
+
+        self.result_cache.put(cache_key, (num_hits, search_result))
+
+        return search_result
+
+
+    def search_stream(self, search_query: SearchQuery, context):
+
+        query: str = search_query.query
+        num_hits: int = search_query.num_hits
+
+        projection: Projection = search_query.projection
+
+        collections, bm25_k1, bm25_b, search_mode = self.__search_settings(search_query)
+
+        cache_key = (normalise_query(query), collections, bm25_k1, bm25_b, projection_key(projection), search_mode)
+        search_result = self.__cached_search_result(cache_key, num_hits)
+
+        if search_result is not None:
+            yield from search_result.documents
+            return
 
+        if search_mode == SearchQuery.PASSAGE:
+            #documents are only complete once every passage has been grouped
+            search_result = self.__passage_search(collections, query, num_hits, bm25_k1, bm25_b, projection)
+            self.result_cache.put(cache_key, (num_hits, search_result))
+
+            yield from search_result.documents
+            return
+
+        scored_hits = self.__retrieve(collections, query, num_hits, bm25_k1, bm25_b)
+
+        #converting the hits is the slow part, so each one is sent as soon as it is converted
         search_result = SearchResult()
 
-        for hit in hits:
-            retrieved_document = self.__convert_search_response(hit)
+        for hit, score in scored_hits:
+            retrieved_document = Document()
+            self.__convert_hit(hit, score, projection, retrieved_document)
             search_result.documents.append(retrieved_document)
 
-        return search_result
+            yield retrieved_document
+
+        #only a stream that ran to completion holds the full result
+        self.result_cache.put(cache_key, (num_hits, search_result))
+
+
+    def batch_search(self, batch_search_query: BatchSearchQuery, context):
+
+        threads: int = batch_search_query.threads or self.batch_threads
+
+        batch_search_result = BatchSearchResult()
+
+        #queries that are not cached are grouped by the searcher settings they need,
+        #each group then runs as a single multi-threaded batch
+        query_groups = defaultdict(list)
+
+        for search_query in batch_search_query.queries:
+            collections, bm25_k1, bm25_b, search_mode = self.__search_settings(search_query)
+
+            cache_key = (normalise_query(search_query.query), collections, bm25_k1, bm25_b, projection_key(search_query.projection), search_mode)
+            search_result = self.__cached_search_result(cache_key, search_query.num_hits)
+
+            if search_result is not None:
+                batch_search_result.results[search_query.query_id].CopyFrom(search_result)
+            else:
+                query_groups[(collections, bm25_k1, bm25_b, projection_key(search_query.projection), search_mode, search_query.num_hits)].append((search_query, cache_key))
+
+        for (collections, bm25_k1, bm25_b, _, search_mode, num_hits), group in query_groups.items():
+
+            #every query of the group has the same projection
+            projection: Projection = group[0][0].projection
+
+            if search_mode == SearchQuery.PASSAGE:
+                search_results = {
+                    search_query.query_id: self.__passage_search(collections, search_query.query, num_hits, bm25_k1, bm25_b, projection)
+                    for search_query, _ in group
+                }
+            elif len(collections) == 1:
+                queries = [search_query.query for search_query, _ in group]
+                query_ids = [search_query.query_id for search_query, _ in group]
+
+                with self.searcher_pool.acquire(collections[0], bm25_k1, bm25_b) as searcher:
+                    hits_per_query = searcher.batch_search(queries, query_ids, k=num_hits, threads=threads)
+
+                search_results = {
+                    query_id: self.__convert_hits([(hit, hit.score) for hit in hits], projection) for query_id, hits in hits_per_query.items()
+                }
+            else:
+                #federated searches already run each collection on its own thread
+                search_results = {
+                    search_query.query_id: self.__convert_hits(self.federated_searcher.search(collections, search_query.query, num_hits, bm25_k1, bm25_b), projection)
+                    for search_query, _ in group
+                }
+
+            for search_query, cache_key in group:
+                search_result = search_results[search_query.query_id]
+
+                self.result_cache.put(cache_key, (num_hits, search_result))
+                batch_search_result.results[search_query.query_id].CopyFrom(search_result)
+
+        return batch_search_result
 
     
     def get_document(self, document_query: DocumentQuery, context):
 
         document_id = document_query.document_id
         
-        index = document_id.split("_")[0].strip()
+        retrieved_document = self.__parsed_document(document_id)
 
-        self.chosen_searcher = self.indexes[index]
+        if retrieved_document is not None:
+            return retrieved_document
+
+        index = document_id.split("_")[0].strip()
 
-        hit = self.chosen_searcher.doc(document_id)
+        with self.searcher_pool.acquire(index) as searcher:
+            hit = searcher.doc(document_id)
 
         retrieved_document = self.__convert_search_response(hit)
+        self.document_cache.put(document_id, retrieved_document)
+
+        return retrieved_document
+
+
+    def get_documents(self, documents_query: DocumentsQuery, context):
+
+        parsed_documents = {}
+
+        #documents that are neither cached nor in a document store are looked up with one searcher per index
+        index_document_ids = defaultdict(list)
+
+        for document_id in documents_query.document_ids:
+            retrieved_document = self.__parsed_document(document_id)
+
+            if retrieved_document is not None:
+                parsed_documents[document_id] = retrieved_document
+            else:
+                index = document_id.split("_")[0].strip()
+
+                if index in self.searcher_pool.index_paths:
+                    index_document_ids[index].append(document_id)
+
+        for index, document_ids in index_document_ids.items():
+
+            with self.searcher_pool.acquire(index) as searcher:
+                hits = [(document_id, searcher.doc(document_id)) for document_id in document_ids]
+
+            for document_id, hit in hits:
+                if hit is not None:
+                    parsed_documents[document_id] = self.__convert_search_response(hit)
+                    self.document_cache.put(document_id, parsed_documents[document_id])
+
+        #documents are returned in the order they were asked for, unknown ids are left out
+        documents = Documents()
+
+        for document_id in documents_query.document_ids:
+            if document_id in parsed_documents:
+                documents.documents.add().CopyFrom(parsed_documents[document_id])
+
+        return documents
+
+    
+    def __search_settings(self, search_query: SearchQuery):
+
+        collections = self.__search_collections(search_query.search_parameters)
+
+        bm25_b = float(search_query.search_parameters.parameters["b"])
+        bm25_k1 = float(search_query.search_parameters.parameters["k1"])
+
+        return collections, bm25_k1, bm25_b, search_query.search_mode
+
+
+    def __search_collections(self, search_parameters: SearchParameters) -> Tuple[str]:
+
+        #a subset of collections can be searched together, otherwise the single collection is searched
+        requested_collections = search_parameters.collections or [search_parameters.collection]
+        collections = {SearchParameters.Collection.Name(collection) for collection in requested_collections}
+
+        if 'ALL' in collections:
+            if not self.federate_all:
+                return ('ALL',)
+
+            return self.federated_collections
+
+        return tuple(sorted(collections))
+
+
+    def __retrieve(self, collections: Tuple[str], query: str, num_hits: int, bm25_k1: float, bm25_b: float) -> List[Tuple]:
+
+        """
+        Returns the top hits as (hit, score) pairs, merged over the collections if there are several
+        """
+
+        if len(collections) > 1:
+            return self.federated_searcher.search(collections, query, num_hits, bm25_k1, bm25_b)
+
+        with self.searcher_pool.acquire(collections[0], bm25_k1, bm25_b) as searcher:
+            hits = searcher.search(query, num_hits)
+
+        return [(hit, hit.score) for hit in hits]
+
+    
+    def __passage_search(self, collections: Tuple[str], query: str, num_hits: int, bm25_k1: float, bm25_b: float, projection: Projection) -> SearchResult:
+
+        """
+        Searches the passage indexes of the collections and groups the passages
+        retrieved into their documents. Documents are ranked by, and scored with,
+        their best passage (MaxP) and hold only their retrieved passages, best
+        first, as far as the projection allows.
+        """
+
+        #passage indexes are only kept per collection
+        if collections == ('ALL',):
+            collections = self.federated_collections
+
+        passage_collections = tuple(collection + '_PASSAGES' for collection in collections)
+        scored_passages = self.__retrieve(passage_collections, query, num_hits * self.passage_depth, bm25_k1, bm25_b)
+
+        search_result = SearchResult()
+        retrieved_documents = {}
+
+        for hit, score in scored_passages:
+            stored_passage = json.loads(hit.raw)
+            document_id = stored_passage["doc_id"]
+
+            if document_id not in retrieved_documents:
+                if len(retrieved_documents) == num_hits:
+                    continue
+
+                #passages come best first, so the first passage of a document is its best
+                retrieved_document = search_result.documents.add()
+                retrieved_document.id = document_id
+                retrieved_document.score = score
+
+                if not projection.ids_only:
+                    retrieved_document.url = stored_passage["url"]
+                    retrieved_document.title = stored_passage["title"]
+
+                retrieved_documents[document_id] = retrieved_document
+
+            retrieved_document = retrieved_documents[document_id]
+
+            if projection.ids_only or (projection.max_passages and len(retrieved_document.passages) >= projection.max_passages):
+                continue
+
+            chunked_passage = retrieved_document.passages.add()
+            chunked_passage.id = stored_passage["passage_id"]
+            chunked_passage.score = score
+
+            if not projection.exclude_bodies:
+                chunked_passage.body = stored_passage["body"]
+
+        return search_result
+
+    
+    def __cached_search_result(self, cache_key, num_hits: int):
+
+        cached_result = self.result_cache.get(cache_key)
+
+        if not cached_result:
+            return None
+
+        cached_num_hits, cached_search_result = cached_result
+
+        #a passage search can return fewer documents than asked for without running out of passages
+        *_, search_mode = cache_key
+        ran_out_of_hits = search_mode == SearchQuery.DOCUMENT and len(cached_search_result.documents) < cached_num_hits
+
+        #a search for more hits, or one that ran out of hits, also answers this one
+        if num_hits > cached_num_hits and not ran_out_of_hits:
+            return None
+
+        search_result = SearchResult()
+        search_result.documents.extend(cached_search_result.documents[:num_hits])
+
+        return search_result
+
+    
+    def __convert_hits(self, scored_hits: List[Tuple], projection: Projection) -> SearchResult:
+
+        search_result = SearchResult()
+
+        for hit, score in scored_hits:
+            self.__convert_hit(hit, score, projection, search_result.documents.add())
+
+        return search_result
+
+
+    def __convert_hit(self, hit, score: float, projection: Projection, retrieved_document: Document) -> None:
+
+        #only the parts of the document the projection asks for are copied, ids need no parsing at all
+        if projection.ids_only:
+            retrieved_document.id = hit.docid
+        else:
+            copy_projected_document(self.__parsed_document(hit.docid, hit), retrieved_document, projection)
+
+        retrieved_document.score = score
+
+
+    def __parsed_document(self, document_id: str, hit = None) -> Document:
+
+        """
+        Returns a document from the cache or, failing that, from its collection's
+        document store or by parsing the raw document of the hit, if one is given.
+        Returns None if none of these has it. The returned document is shared
+        through the cache, so it must be copied before it is changed.
+        """
+
+        retrieved_document = self.document_cache.get(document_id)
+
+        if retrieved_document is not None:
+            return retrieved_document
+
+        docstore = self.docstores.get(document_id.split("_")[0].strip())
+
+        if docstore:
+            retrieved_document = docstore.get(document_id)
+
+        if retrieved_document is None and hit is not None:
+            retrieved_document = self.__convert_search_response(hit)
+
+        if retrieved_document is not None:
+            self.document_cache.put(document_id, retrieved_document)
 
         return retrieved_document
 
@@ -71,18 +446,34 @@ class PyseriniSearcher(AbstractSearcher):
     def __convert_search_response(self, hit):
 
         retrieved_document = Document()
-        soup = None
 
-        try:
-            #This works if it is a regular search hit
-            soup = bs(hit.raw, "lxml")
+        if isinstance(hit.raw, str):
+            #This is a regular search hit
+            raw_document = hit.raw
             retrieved_document.id = hit.docid
-            retrieved_document.score = hit.score
-        except:
-            #This works if it is a document lookup
-            soup = bs(hit.raw(), "lxml")
+        else:
+            #This is a document lookup
+            raw_document = hit.raw()
             retrieved_document.id = hit.docid()
-        
+
+        if raw_document.startswith('{'):
+            #Documents indexed as a JsonCollection keep their passages as structured JSON
+            parsed_document = json.loads(raw_document)
+
+            retrieved_document.url = parsed_document["url"]
+            retrieved_document.title = parsed_document["title"]
+
+            for passage in parsed_document["passages"]:
+                chunked_passage = Passage()
+                chunked_passage.id = str(passage["id"])
+                chunked_passage.body = passage["body"]
+
+                retrieved_document.passages.append(chunked_passage)
+
+            return retrieved_document
+
+        soup = bs(raw_document, "lxml")
+
         retrieved_document.url = soup.find("url").text
         retrieved_document.title = soup.find("title").text
         
@@ -0,0 +1,276 @@
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from pyserini.index import IndexReader
+from pyserini.search import SimpleSearcher
+from typing import Callable, Dict, List
+
+import os
+import threading
+
+def index_size(index_path: str) -> int:
+
+    """
+    Size on disk of an index, used as an estimate of the memory it takes once open
+    """
+
+    return sum(entry.stat().st_size for entry in os.scandir(index_path) if entry.is_file())
+
+def index_exists(index_path: str) -> bool:
+    return os.path.isdir(index_path) and any(file_name.startswith('segments_') for file_name in os.listdir(index_path))
+
+def close_index_reader(index_reader: IndexReader) -> None:
+    index_reader.reader.close()
+
+class SearcherPool:
+
+    """
+    Pool of SimpleSearcher instances over the indexes. A SimpleSearcher holds its
+    BM25 parameters as state, so each instance is lent to a single request at a
+    time. An idle instance with the parameters a request asks for is preferred,
+    any other idle instance of the collection is retuned, and new instances are
+    created only when every instance of the collection is in use.
+
+    If max_searchers_per_index is set, no more searchers than that are kept
+    for an index, whatever BM25 parameters they were asked for: once they are
+    all in use, a request waits for one to be released.
+
+    Each open index also has one IndexReader, shared by every request reading
+    index statistics and document vectors from it.
+
+    Indexes are opened on first use. If max_open_indexes or max_index_bytes is
+    set, opening an index over that budget closes the least recently used ones.
+    Their idle searchers and unused reader are closed right away, those in use
+    when they are released.
+    """
+
+    def __init__(self, index_paths: Dict[str, str], max_open_indexes: int = None, max_index_bytes: int = None,
+                 max_searchers_per_index: int = None) -> None:
+        self.index_paths = index_paths
+        self.max_open_indexes = max_open_indexes
+        self.max_index_bytes = max_index_bytes
+        self.max_searchers_per_index = max_searchers_per_index
+
+        # collection -> list of (bm25 parameters, searcher)
+        self.idle_searchers = defaultdict(list)
+        # collection -> size of its index, least recently used first
+        self.open_indexes = OrderedDict()
+        # bumped when an index is closed, so searchers lent before then are closed on release
+        self.generations = defaultdict(int)
+        # collection -> searchers created and not yet closed, idle or lent
+        self.searcher_counts = defaultdict(int)
+        # collection -> {'reader', 'leases', 'retired'}, retired readers are closed by their last lease
+        self.index_readers = {}
+        self.lock = threading.Condition()
+
+    def create_searcher(self, collection: str, k1: float = None, b: float = None) -> SimpleSearcher:
+        searcher = SimpleSearcher(self.index_paths[collection])
+
+        if k1 is not None and b is not None:
+            searcher.set_bm25(k1, b)
+
+        return searcher
+
+    def preload(self, collections: List[str]) -> None:
+
+        """
+        Opens the indexes of the given collections ahead of their first request
+        """
+
+        for collection in collections:
+            with self.acquire(collection):
+                pass
+
+    @contextmanager
+    def acquire(self, collection: str, k1: float = None, b: float = None):
+
+        """
+        Lends a searcher for the collection, with the given BM25 parameters if any,
+        for the duration of the with block. Document lookups do not depend on the
+        BM25 parameters and can leave them out.
+        """
+
+        if collection not in self.index_paths:
+            raise KeyError("Unknown collection: {}".format(collection))
+
+        with self.lock:
+            while not self.idle_searchers[collection] and self.__at_searcher_limit(collection):
+                self.lock.wait()
+
+            closers = self.__open_index(collection)
+            generation = self.generations[collection]
+            bm25_parameters, searcher = self.__take_idle_searcher(collection, (k1, b))
+
+            # a searcher about to be created is counted already, so concurrent requests wait for it
+            if searcher is None:
+                self.searcher_counts[collection] += 1
+
+        self.__close(closers)
+
+        if searcher is None:
+            try:
+                searcher = self.create_searcher(collection, k1, b)
+            except Exception:
+                self.__discard(collection)
+                raise
+
+            bm25_parameters = (k1, b)
+        elif k1 is not None and b is not None and bm25_parameters != (k1, b):
+            searcher.set_bm25(k1, b)
+            bm25_parameters = (k1, b)
+
+        try:
+            yield searcher
+        finally:
+            with self.lock:
+                released = self.generations[collection] == generation
+
+                if released:
+                    self.idle_searchers[collection].append((bm25_parameters, searcher))
+                    self.lock.notify_all()
+
+            if not released:
+                self.__discard(collection, searcher)
+
+    @contextmanager
+    def acquire_reader(self, collection: str):
+
+        """
+        Lends the IndexReader of the collection's index for the duration of the with block.
+        The reader is shared by concurrent requests and closed along with the index.
+        """
+
+        if collection not in self.index_paths:
+            raise KeyError("Unknown collection: {}".format(collection))
+
+        with self.lock:
+            closers = self.__open_index(collection)
+            generation = self.generations[collection]
+            reader_entry = self.index_readers.get(collection)
+
+            if reader_entry is not None:
+                reader_entry['leases'] += 1
+
+        self.__close(closers)
+
+        if reader_entry is None:
+            try:
+                index_reader = IndexReader(self.index_paths[collection])
+            except Exception:
+                with self.lock:
+                    self.__forget_unopened_index(collection)
+                raise
+
+            with self.lock:
+                reader_entry = self.index_readers.get(collection)
+
+                # another request may have opened the reader meanwhile, or the index may have been closed
+                if reader_entry is None:
+                    reader_entry = {'reader': index_reader, 'leases': 0, 'retired': self.generations[collection] != generation}
+                    index_reader = None
+
+                    if not reader_entry['retired']:
+                        self.index_readers[collection] = reader_entry
+
+                reader_entry['leases'] += 1
+
+            if index_reader is not None:
+                close_index_reader(index_reader)
+
+        try:
+            yield reader_entry['reader']
+        finally:
+            with self.lock:
+                reader_entry['leases'] -= 1
+                closed = reader_entry['retired'] and not reader_entry['leases']
+
+            if closed:
+                close_index_reader(reader_entry['reader'])
+
+    def __take_idle_searcher(self, collection: str, bm25_parameters):
+
+        idle_searchers = self.idle_searchers[collection]
+
+        if not idle_searchers:
+            return None, None
+
+        for position, (idle_bm25_parameters, _) in enumerate(idle_searchers):
+            if idle_bm25_parameters == bm25_parameters:
+                return idle_searchers.pop(position)
+
+        return idle_searchers.pop()
+
+    def __open_index(self, collection: str) -> List[Callable]:
+
+        """
+        Marks the index as the most recently used and, if it was not open, closes
+        indexes until it fits in the budget. Returns the close methods of the idle
+        searchers and unused readers of the closed indexes, to call outside the lock.
+        """
+
+        if collection in self.open_indexes:
+            self.open_indexes.move_to_end(collection)
+            return []
+
+        self.open_indexes[collection] = index_size(self.index_paths[collection]) if self.max_index_bytes else 0
+
+        closers = []
+
+        while len(self.open_indexes) > 1 and self.__over_budget():
+            least_recent_collection = next(iter(self.open_indexes))
+            del self.open_indexes[least_recent_collection]
+
+            self.generations[least_recent_collection] += 1
+
+            idle_searchers = [searcher for _, searcher in self.idle_searchers.pop(least_recent_collection, [])]
+            self.searcher_counts[least_recent_collection] -= len(idle_searchers)
+            closers.extend(searcher.close for searcher in idle_searchers)
+
+            reader_entry = self.index_readers.pop(least_recent_collection, None)
+
+            if reader_entry is not None:
+                reader_entry['retired'] = True
+
+                if not reader_entry['leases']:
+                    closers.append(lambda index_reader=reader_entry['reader']: close_index_reader(index_reader))
+
+        if closers:
+            self.lock.notify_all()
+
+        return closers
+
+    def __at_searcher_limit(self, collection: str) -> bool:
+        return bool(self.max_searchers_per_index) and self.searcher_counts[collection] >= self.max_searchers_per_index
+
+    def __discard(self, collection: str, searcher: SimpleSearcher = None) -> None:
+
+        """
+        Closes a searcher that is no longer kept, or frees the place of one that could not be created
+        """
+
+        if searcher is not None:
+            searcher.close()
+
+        with self.lock:
+            self.searcher_counts[collection] -= 1
+
+            if searcher is None:
+                self.__forget_unopened_index(collection)
+
+            self.lock.notify_all()
+
+    def __forget_unopened_index(self, collection: str) -> None:
+
+        # an index that could not be opened does not count toward the budget
+        if not self.searcher_counts[collection] and collection not in self.index_readers:
+            self.open_indexes.pop(collection, None)
+
+    def __over_budget(self) -> bool:
+
+        if self.max_open_indexes and len(self.open_indexes) > self.max_open_indexes:
+            return True
+
+        return bool(self.max_index_bytes) and sum(self.open_indexes.values()) > self.max_index_bytes
+
+    def __close(self, closers: List[Callable]) -> None:
+        for close in closers:
+            close()
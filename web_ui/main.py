@@ -1,4 +1,4 @@
-from flask import Flask, render_template, request
+from flask import Flask, render_template, request, stream_template
 import os
 
 import time
@@ -82,44 +82,51 @@ def search():
     elif args["collection"] == "WAPO":
         search_query.search_parameters.collection = 3
 
+    #passages that would not be shown, or reranked, are left out by the searcher
+    if args["skipRerank"] == "true":
+        search_query.projection.max_passages = int(args["passageCount"])
+    else:
+        search_query.projection.max_passages = int(args["passageLimit"])
+
     start_time = time.time()
-    search_result = search_client.search(search_query)
+
+    def elapsed_seconds():
+        return int(time.time() - start_time)
 
     passage_limit = int(args["passageCount"])
 
     if args["skipRerank"] == "true":
         
-        documents = []
-        for document in search_result.documents:
-            converted_document = MessageToDict(document)
-            converted_document['passages'] = converted_document['passages'][:passage_limit]
-            documents.append(converted_document)
-        
-        end_time = time.time()
-        duration = int(end_time - start_time)
+        #documents are rendered as they arrive from the searcher, so the first
+        #results show up before the rest have been retrieved
+        streamed_documents = search_client.search_stream(search_query)
         
-        return render_template("results.html", docs = documents, 
-            numFound=len(documents), duration=duration, query=search_query.query)
+        return stream_template("results.html", docs = convert_documents(streamed_documents, passage_limit), 
+            duration=elapsed_seconds, query=search_query.query)
     
+    search_result = search_client.search(search_query)
+
     rerank_request = RerankRequest()
     rerank_request.search_query = search_query.query
 
     rerank_request.num_passages = int(args["passageLimit"])
+    rerank_request.reranker = RerankRequest.Reranker.Value(args.get("reranker", "T5").strip())
+    rerank_request.latency_budget_ms = int(args.get("rerankBudget") or 0)
     rerank_request.search_result.MergeFrom(search_result)
 
     rerank_result = rerank_client.rerank(rerank_request)
     
-    documents = []
-    for document in rerank_result.documents:
-        converted_document = MessageToDict(document)
-        converted_document['passages'] = converted_document['passages'][:passage_limit]
-        documents.append(converted_document)
-        
-    end_time = time.time()
-    duration = int(end_time - start_time)
+    documents = list(convert_documents(rerank_result.documents, passage_limit))
         
     return render_template("results.html", docs = documents, 
-        numFound=len(documents), duration=duration, query=search_query.query)
+        duration=elapsed_seconds, query=search_query.query, rerank_result=rerank_result)
+
+
+def convert_documents(documents, passage_limit):
+    for document in documents:
+        converted_document = MessageToDict(document)
+        converted_document['passages'] = converted_document['passages'][:passage_limit]
+        yield converted_document
 
 
 @app.route('/rewrite', methods=['POST'])
@@ -16,6 +16,7 @@ var rewriteLogs = [];
 var G_k1 = "#k1_bm25";
 var G_b = "#b_bm25"
 var G_skip_rerank = "#skip_rerank"
+var G_rerankBudget = "#rerank_budget";
 
 
 $(G_searchButton).click(function () {
@@ -27,6 +28,7 @@ $(G_searchButton).click(function () {
     var collection = $(G_collection).val();
     var reranker = $(G_reranker).val()
     var skipRerank = $(G_skip_rerank).is(':checked').toString();
+    var rerankBudget = $(G_rerankBudget).val();
     var b = $(G_b).val();
     var k1 = $(G_k1).val();
 
@@ -39,7 +41,7 @@ $(G_searchButton).click(function () {
     var url = `/search?query=${searchQuery}&numDocs=${numDocs}
     &passageCount=${passageCount}&passageLimit=${passageLimit}
     &backend=${backend}&collection=${collection}&reranker=${reranker}
-    &skipRerank=${skipRerank}&b=${b}&k1=${k1}`;
+    &skipRerank=${skipRerank}&rerankBudget=${rerankBudget}&b=${b}&k1=${k1}`;
     window.location.href = url
 });
 
@@ -2,7 +2,9 @@ var G_searchBar = "#searchbar_top"
 var G_searchButton = "#search_btn_top"
 var G_getTrecEval = "#download_trec_eval"
 var G_getSearchResults = "#download_search_results"
-var results = JSON.parse($(".pages").attr("results"));
+var results = $(".pages li").map(function () {
+    return JSON.parse($(this).attr("data-doc"));
+}).get();
 var G_trecEvalResults = [];
 
 $(G_searchButton).click(function () {